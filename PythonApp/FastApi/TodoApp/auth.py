@@ -1,20 +1,31 @@
+import hashlib
+import os
+import secrets
 from datetime import datetime, timedelta
-from fastapi import Depends, FastAPI
+from fastapi import APIRouter, Depends, FastAPI, Request
 from fastapi.security import OAuth2PasswordRequestForm, OAuth2PasswordBearer
-from jose import jwt, JWTError
-from passlib.context import CryptContext
 from pydantic import BaseModel
-from sqlalchemy import exc
+from sqlalchemy import event, exc
 from sqlalchemy.orm import Session
 from typing import Optional
 
-from database import SessionLocal, alchemy_engine
-from exceptions import sqlalchemy_exception, get_user_exception, get_token_exception
+from database import get_db, get_read_db, release_db, run_db
+from exceptions import sqlalchemy_exception, get_user_exception, get_token_exception, \
+    invalid_refresh_token_exception, login_rate_limited_exception
+from hashing import bcrypt_rounds, get_password_hash, hashing_pool, verify_password
+from instrumentation import instrument, timed
+from rate_limit import login_rate_limiter
 from responses import successful_response
+from startup import lifespan, router as startup_router
+from token_cache import token_cache
+from user_cache import UserCredentials, user_cache
+import crud
 import models
 
 SECRET_KET = "3Fj1Xek1qM5vfQmMLyLIWXvBHPSSGHeI"
 ALGORITHM = "HS256"
+ACCESS_TOKEN_MINUTES = 20
+REFRESH_TOKEN_DAYS = int(os.environ.get("TODO_REFRESH_TOKEN_DAYS", 14))
 
 
 class CreateUser(BaseModel):
@@ -25,70 +36,150 @@ class CreateUser(BaseModel):
     password: str
 
 
-bcrypt_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+class RefreshToken(BaseModel):
+    refresh_token: str
 
-models.Base.metadata.create_all(bind=alchemy_engine)
 
 oauth2_bearer = OAuth2PasswordBearer(tokenUrl="token")
+optional_oauth2_bearer = OAuth2PasswordBearer(tokenUrl="token", auto_error=False)
 
-
-app = FastAPI()
-
-
-def get_db():
-    db = None
-    try:
-        db = SessionLocal()
-        yield db
-    finally:
-        db.close()
+router = APIRouter()
 
 
 # API Endpoints
-@app.post("/create/user")
-async def create_new_user(create_user: CreateUser, db: Session = Depends(get_db)) -> models.Users:
+@router.post("/create/user")
+async def create_new_user(create_user: CreateUser, db: Session = Depends(get_db)) -> dict[str, str | int]:
     user_model = models.Users()
     user_model.email = create_user.email
     user_model.username = create_user.username
     user_model.first_name = create_user.first_name
     user_model.last_name = create_user.last_name
 
-    hash_pw = get_password_hash(create_user.password)
+    hash_pw = await hashing_pool.run(get_password_hash, create_user.password)
 
     user_model.hashed_pw = hash_pw
     user_model.is_active = True
 
     try:
-        db.add(user_model)
-        db.commit()
+        await run_db(db, crud.create_user, user_model)
     except exc.SQLAlchemyError as error:
         raise sqlalchemy_exception(error)
     return successful_response(201)
 
 
-@app.post("/token")
-async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(),
+@router.post("/token")
+async def login_for_access_token(request: Request,
+                                 form_data: OAuth2PasswordRequestForm = Depends(),
+                                 read_db: Session = Depends(get_read_db),
                                  db: Session = Depends(get_db)):
-    user: Optional[models.Users] = authenticate_user(form_data.username, form_data.password, db)
+    # Checked before the user lookup and bcrypt so bursts cost next to nothing.
+    retry_after = login_rate_limiter.check(form_data.username, request.client.host if request.client else "")
+    if retry_after:
+        raise login_rate_limited_exception(retry_after)
+
+    user: Optional[UserCredentials] = await authenticate_user(form_data.username, form_data.password, read_db, db)
 
     if not user:
         raise get_token_exception()
+    login_rate_limiter.succeeded(form_data.username)
 
-    token_expires = timedelta(minutes=20)
+    token_expires = timedelta(minutes=ACCESS_TOKEN_MINUTES)
     token = create_access_token(user.username, user.id, expires_delta=token_expires)
-    return {"token": token}
+
+    refresh_token = secrets.token_urlsafe(32)
+    try:
+        await run_db(db, crud.create_refresh_token, user.id, hash_refresh_token(refresh_token),
+                     datetime.utcnow() + timedelta(days=REFRESH_TOKEN_DAYS))
+    except exc.SQLAlchemyError as error:
+        raise sqlalchemy_exception(error)
+    return {"token": token, "refresh_token": refresh_token}
 
 
-# Private Methods
-def authenticate_user(username: str, password: str, db: Session):
-    user: models.Users = db.query(models.Users)\
-        .filter(models.Users.username == username)\
-        .first()
+@router.post("/token/refresh")
+async def refresh_access_token(refresh: RefreshToken, db: Session = Depends(get_db)):
+    # Exchanges a refresh token for a new access token and a new refresh token,
+    # one indexed lookup instead of a bcrypt verification. The old one is revoked.
+    refresh_token = secrets.token_urlsafe(32)
+    try:
+        user = await run_db(db, crud.rotate_refresh_token, hash_refresh_token(refresh.refresh_token),
+                            hash_refresh_token(refresh_token), datetime.utcnow() + timedelta(days=REFRESH_TOKEN_DAYS))
+    except exc.SQLAlchemyError as error:
+        raise sqlalchemy_exception(error)
 
     if not user:
+        raise invalid_refresh_token_exception()
+
+    user_id, username = user
+    token = create_access_token(username, user_id, expires_delta=timedelta(minutes=ACCESS_TOKEN_MINUTES))
+    return {"token": token, "refresh_token": refresh_token}
+
+
+@router.post("/token/revoke")
+async def revoke_refresh_token(refresh: RefreshToken, db: Session = Depends(get_db)) -> dict[str, str | int]:
+    try:
+        revoked = await run_db(db, crud.revoke_refresh_token, hash_refresh_token(refresh.refresh_token))
+    except exc.SQLAlchemyError as error:
+        raise sqlalchemy_exception(error)
+
+    if not revoked:
+        raise invalid_refresh_token_exception()
+    return successful_response(200)
+
+
+# response_model=None, as pydantic v1 would coerce the float timings to int.
+@router.get("/metrics/hashing", response_model=None)
+async def read_hashing_metrics() -> dict[str, int | float]:
+    return {**hashing_pool.stats(), "bcrypt_rounds": bcrypt_rounds()}
+
+
+@router.get("/metrics/token-cache")
+async def read_token_cache_metrics() -> dict[str, int]:
+    return token_cache.stats()
+
+
+# response_model=None, as pydantic v1 would turn "enabled" into 0 or 1.
+@router.get("/metrics/login-rate-limit", response_model=None)
+async def read_login_rate_limit_metrics() -> dict[str, int | bool]:
+    return login_rate_limiter.stats()
+
+
+@router.get("/metrics/user-cache")
+async def read_user_cache_metrics() -> dict[str, int]:
+    return user_cache.stats()
+
+
+# Private Methods
+async def authenticate_user(username: str, password: str, read_db: Session, db: Session):
+    user = await read_user_credentials(username, read_db)
+    # Hashing takes a few hundred ms; no pooled connection is held meanwhile.
+    await release_db(read_db)
+
+    # Same rule as crud.is_user_active, checked before paying for a hash.
+    if not user or user.is_active is False or user.date_deactivated is not None:
         return None
-    if not verify_password(password, user.hashed_pw):
+    verified, new_hash = await hashing_pool.run(verify_password, password, user.hashed_pw)
+    if not verified:
         return None
+    if new_hash:
+        # Hashes made under another cost are upgraded on login, the only time
+        # the plain password is at hand. Failing to store it must not fail the login.
+        try:
+            await run_db(db, crud.update_user_password_hash, user.id, user.hashed_pw, new_hash)
+        except exc.SQLAlchemyError:
+            pass
+        user_cache.invalidate(username)
+    return user
+
+
+async def read_user_credentials(username: str, db: Session) -> Optional[UserCredentials]:
+    user = user_cache.get(username)
+    if user:
+        return user
+
+    generation = user_cache.generation()
+    user = await run_db(db, crud.read_user_credentials, username)
+    if user:
+        user_cache.put(user, generation)
     return user
 
 
@@ -99,24 +190,85 @@ def create_access_token(username: str, user_id: int, expires_delta: Optional[tim
     else:
         expire = datetime.utcnow() + timedelta(minutes=15)
     encode.update({"exp": expire})
+    # python-jose loads its crypto backends on import, so it is imported on
+    # first use (or by the startup warm-up) instead of with this module.
+    from jose import jwt
+
     return jwt.encode(encode, SECRET_KET, algorithm=ALGORITHM)
 
 
-async def get_current_user(token: str = Depends(oauth2_bearer)):
+def hash_refresh_token(refresh_token: str) -> str:
+    # Refresh tokens are random and long, so a fast hash is enough to keep a
+    # leaked table from being replayed; bcrypt would defeat the purpose.
+    return hashlib.sha256(refresh_token.encode()).hexdigest()
+
+
+async def get_current_user(token: str = Depends(oauth2_bearer), db: Session = Depends(get_read_db)):
+    cached_user = token_cache.get(token)
+    if cached_user:
+        return dict(cached_user)
+
+    from jose import JWTError, jwt
+
     try:
-        payload = jwt.decode(token, SECRET_KET, algorithm=ALGORITHM)
+        with timed("jwt"):
+            payload = jwt.decode(token, SECRET_KET, algorithms=[ALGORITHM])
         username: str = payload.get("sub")
         user_id: int = payload.get("id")
         if not username or not user_id:
             raise get_user_exception()
-        return {"username": username, "id": user_id}
     except JWTError as error:
         raise get_user_exception()
 
+    # Checked on every miss, so once deactivation drops a user's cached
+    # tokens they stop working everywhere within TODO_TOKEN_CACHE_TTL.
+    if not await run_db(db, crud.is_user_active, user_id):
+        raise get_user_exception()
+
+    user = {"username": username, "id": user_id}
+    if "exp" in payload:
+        token_cache.put(token, dict(user), payload["exp"])
+    return user
+
+
+async def get_optional_user(token: Optional[str] = Depends(optional_oauth2_bearer),
+                            db: Session = Depends(get_read_db)):
+    if not token:
+        return None
+    return await get_current_user(token, db)
+
+
+@event.listens_for(models.Users.date_deactivated, "set")
+def invalidate_deactivated_user(target: models.Users, value, old_value, initiator) -> None:
+    if value is not None and target.id is not None:
+        token_cache.invalidate_user(target.id)
+
+
+@event.listens_for(models.Users.is_active, "set")
+def invalidate_inactive_user(target: models.Users, value, old_value, initiator) -> None:
+    if value is False and target.id is not None:
+        token_cache.invalidate_user(target.id)
+
+
+@event.listens_for(models.Users, "after_insert")
+@event.listens_for(models.Users, "after_update")
+@event.listens_for(models.Users, "after_delete")
+def invalidate_cached_user(mapper, connection, target: models.Users) -> None:
+    # Covers ORM writes; Core updates such as crud.update_user_password_hash
+    # invalidate explicitly.
+    if target.username:
+        user_cache.invalidate(target.username)
+
 
-def get_password_hash(password) -> str:
-    return bcrypt_context.hash(password)
+@event.listens_for(models.Users.username, "set", active_history=True)
+def invalidate_renamed_user(target: models.Users, value, old_value, initiator) -> None:
+    # active_history loads the previous name even when the instance was expired.
+    if isinstance(old_value, str) and old_value != value:
+        user_cache.invalidate(old_value)
 
 
-def verify_password(pw: str, hash_pw: str) -> bool:
-    return bcrypt_context.verify(pw, hash_pw)
+# Standalone app, see app.py for the combined one.
+app = FastAPI(lifespan=lifespan)
+instrument(app)
+app.include_router(router)
+app.include_router(startup_router)
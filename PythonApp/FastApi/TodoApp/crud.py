@@ -0,0 +1,330 @@
+import os
+import re
+from datetime import datetime
+from sqlalchemy import ColumnElement, column, delete, exc, func, or_, select, table, text, update
+from sqlalchemy.orm import Query, Session, joinedload, lazyload, selectinload
+from typing import Any, Iterator, Optional
+
+from dto import Loading, Todo, TodoFilters, TodoOut, TodoStats, TodoWithOwner, UserWithTodos
+from user_cache import UserCredentials
+import models
+
+# Keeps each IN (...) list well under SQLite's bound parameter limit.
+BULK_CHUNK_SIZE = 500
+BULK_INSERT_BATCH_SIZE = int(os.environ.get("TODO_BULK_INSERT_BATCH_SIZE", 1000))
+MAX_BULK_INSERT_BATCH_SIZE = 10000
+
+# How Todos.owner / Users.todos are loaded when a response includes them.
+RELATIONSHIP_LOADING = Loading(os.environ.get("TODO_RELATIONSHIP_LOADING", Loading.selectin.value))
+LOADERS = {
+    Loading.selectin: selectinload,
+    Loading.joined: joinedload,
+    Loading.lazy: lazyload,
+}
+
+# Listings select just the TodoOut columns as rows instead of ORM instances.
+TODO_COLUMNS = tuple(models.Todos.__table__.c[name] for name in TodoOut.__fields__)
+
+# FTS5 index over Todos.title/description, see migrations/0003_todos_search.py.
+TODOS_SEARCH = table("todos_search", column("rowid"), column("todos_search"), column("rank"))
+SEARCH_TERM = re.compile(r"\w+")
+MAX_SEARCH_TERMS = 16
+
+# Summary buckets kept by triggers, see migrations/0004_todo_stats.py.
+TODO_STATS = table("todo_stats", column("owner_id"), column("priority"), column("complete"), column("todos"),
+                   column("completed_todos"), column("completion_seconds"))
+# Recounts every bucket in one transaction; completion latency is counted
+# the same way as in the triggers.
+TODO_STATS_REBUILD = (
+    "DELETE FROM todo_stats",
+    "INSERT INTO todo_stats (owner_id, priority, complete, todos, completed_todos, completion_seconds) "
+    "SELECT coalesce(owner_id, 0), coalesce(priority, 0), coalesce(complete, 0), count(*), "
+    "total(completed), total(CASE WHEN completed THEN (julianday(date_completed) - julianday(date_created)) * 86400 END) "
+    "FROM (SELECT *, coalesce(complete AND date_completed IS NOT NULL AND date_created IS NOT NULL, 0) AS completed "
+    "FROM todos) "
+    "GROUP BY 1, 2, 3",
+)
+
+
+# Todos
+def read_todos_page(db: Session, after_id: Optional[int], limit: int) -> list[dict[str, Any]]:
+    query = db.query(*TODO_COLUMNS)
+    if after_id is not None:
+        query = query.filter(models.Todos.id > after_id)
+    return [row._asdict() for row in query.order_by(models.Todos.id).limit(limit)]
+
+
+def owner_todos_query(db: Session, owner_id: int, filters: TodoFilters) -> Query:
+    query = db.query(models.Todos).filter(models.Todos.owner_id == owner_id)
+    if filters.complete is not None:
+        query = query.filter(models.Todos.complete == filters.complete)
+    if filters.priority is not None:
+        query = query.filter(models.Todos.priority == filters.priority)
+    if filters.created_after:
+        query = query.filter(models.Todos.date_created >= filters.created_after)
+    if filters.created_before:
+        query = query.filter(models.Todos.date_created < filters.created_before)
+    if filters.completed_after:
+        query = query.filter(models.Todos.date_completed >= filters.completed_after)
+    if filters.completed_before:
+        query = query.filter(models.Todos.date_completed < filters.completed_before)
+    return query
+
+
+def read_owner_todos_page(db: Session, owner_id: int, filters: TodoFilters,
+                          after_id: Optional[int], limit: int) -> list[dict[str, Any]]:
+    query = owner_todos_query(db, owner_id, filters).with_entities(*TODO_COLUMNS)
+    if after_id is not None:
+        query = query.filter(models.Todos.id > after_id)
+    return [row._asdict() for row in query.order_by(models.Todos.id).limit(limit)]
+
+
+def read_todos_with_owner_page(db: Session, after_id: Optional[int], limit: int,
+                                loading: Loading) -> list[TodoWithOwner]:
+    query = db.query(models.Todos).options(LOADERS[loading](models.Todos.owner))
+    if after_id is not None:
+        query = query.filter(models.Todos.id > after_id)
+    # Serialized here so any lazy loads still happen inside the session.
+    return [TodoWithOwner.from_orm(todo) for todo in query.order_by(models.Todos.id).limit(limit)]
+
+
+def read_todo(db: Session, todo_id: int) -> Optional[dict[str, Any]]:
+    row = db.query(*TODO_COLUMNS) \
+        .filter(models.Todos.id == todo_id) \
+        .first()
+    return row._asdict() if row else None
+
+
+def search_todos_page(db: Session, text: str, offset: int, limit: int) -> list[dict[str, Any]]:
+    match = search_expression(text)
+    if not match:
+        return []
+
+    rows = db.execute(select(*TODO_COLUMNS)
+                      .join_from(TODOS_SEARCH, models.Todos, models.Todos.id == TODOS_SEARCH.c.rowid)
+                      .where(TODOS_SEARCH.c.todos_search.match(match))
+                      .order_by(TODOS_SEARCH.c.rank, models.Todos.id)
+                      .offset(offset)
+                      .limit(limit))
+    return [row._asdict() for row in rows]
+
+
+def read_todo_stats(db: Session) -> TodoStats:
+    # Sums the buckets, never the todos, so this costs the same at any size.
+    return TodoStats(**sum_todo_stats(db)[0],
+                     by_priority=sum_todo_stats(db, func.nullif(TODO_STATS.c.priority, 0).label("priority")),
+                     by_complete=sum_todo_stats(db, TODO_STATS.c.complete),
+                     by_owner=sum_todo_stats(db, func.nullif(TODO_STATS.c.owner_id, 0).label("owner_id")))
+
+
+def rebuild_todo_stats(db: Session) -> None:
+    for statement in TODO_STATS_REBUILD:
+        db.execute(text(statement))
+    db.commit()
+
+
+def create_todo(db: Session, todo: Todo, owner_id: Optional[int] = None) -> None:
+    todo_model = models.Todos()
+    todo_model.title = todo.title
+    todo_model.description = todo.description
+    todo_model.priority = todo.priority
+    todo_model.complete = todo.complete
+    todo_model.owner_id = owner_id
+
+    db.add(todo_model)
+    db.commit()
+
+
+def insert_todos(db: Session, rows: list[dict[str, Any]]) -> list[tuple[int, str]]:
+    # One executemany and one commit per batch. Only when the batch fails are
+    # its rows retried one by one, each in a SAVEPOINT inside a single
+    # transaction, so a bad row is rolled back alone and the batch still
+    # commits once.
+    try:
+        db.execute(models.Todos.__table__.insert(), rows)
+        db.commit()
+        return []
+    except exc.SQLAlchemyError:
+        db.rollback()
+
+    # pysqlite defers BEGIN until the first write, and releasing a savepoint
+    # outside a transaction commits it, so the transaction is opened by hand.
+    db.connection().exec_driver_sql("BEGIN")
+    failures = []
+    for position, row in enumerate(rows):
+        try:
+            with db.begin_nested():
+                db.execute(models.Todos.__table__.insert(), [row])
+        except exc.IntegrityError:
+            failures.append((position, "Violates a database constraint"))
+    db.commit()
+    return failures
+
+
+def update_todo(db: Session, todo_id: int, todo: Todo) -> bool:
+    result = db.execute(update(models.Todos)
+                        .where(models.Todos.id == todo_id)
+                        .values(title=todo.title,
+                                description=todo.description,
+                                priority=todo.priority,
+                                complete=todo.complete)
+                        .execution_options(synchronize_session=False))
+    db.commit()
+    return result.rowcount > 0
+
+
+def delete_todo(db: Session, todo_id: int) -> bool:
+    result = db.execute(delete(models.Todos)
+                        .where(models.Todos.id == todo_id)
+                        .execution_options(synchronize_session=False))
+    db.commit()
+    return result.rowcount > 0
+
+
+def update_todos(db: Session, todo_ids: list[int], values: dict[str, Any]) -> list[int]:
+    updated_ids = []
+    for ids in chunks(todo_ids, BULK_CHUNK_SIZE):
+        result = db.execute(update(models.Todos)
+                            .where(models.Todos.id.in_(ids))
+                            .values(**values)
+                            .returning(models.Todos.id)
+                            .execution_options(synchronize_session=False))
+        updated_ids.extend(result.scalars())
+    db.commit()
+    return updated_ids
+
+
+def delete_todos(db: Session, todo_ids: list[int]) -> list[int]:
+    deleted_ids = []
+    for ids in chunks(todo_ids, BULK_CHUNK_SIZE):
+        result = db.execute(delete(models.Todos)
+                            .where(models.Todos.id.in_(ids))
+                            .returning(models.Todos.id)
+                            .execution_options(synchronize_session=False))
+        deleted_ids.extend(result.scalars())
+    db.commit()
+    return deleted_ids
+
+
+# Users
+def read_user_credentials(db: Session, username: str) -> Optional[UserCredentials]:
+    # Just what a login needs, as a plain tuple rather than an ORM instance.
+    row = db.query(models.Users.id, models.Users.username, models.Users.hashed_pw, models.Users.is_active,
+                   models.Users.date_deactivated)\
+        .filter(models.Users.username == username)\
+        .first()
+    return UserCredentials(*row) if row else None
+
+
+def is_user_active(db: Session, user_id: int) -> bool:
+    row = db.query(models.Users.is_active, models.Users.date_deactivated) \
+        .filter(models.Users.id == user_id) \
+        .first()
+    return bool(row) and row.is_active is not False and row.date_deactivated is None
+
+
+def read_user_with_todos(db: Session, user_id: int, loading: Loading) -> Optional[UserWithTodos]:
+    user = db.query(models.Users) \
+        .options(LOADERS[loading](models.Users.todos)) \
+        .filter(models.Users.id == user_id) \
+        .first()
+    return UserWithTodos.from_orm(user) if user else None
+
+
+def create_user(db: Session, user_model: models.Users) -> None:
+    db.add(user_model)
+    db.commit()
+
+
+def update_user_password_hash(db: Session, user_id: int, old_hash: str, new_hash: str) -> bool:
+    # Only replaces the hash that was verified, never a password changed meanwhile.
+    result = db.execute(update(models.Users)
+                        .where(models.Users.id == user_id, models.Users.hashed_pw == old_hash)
+                        .values(hashed_pw=new_hash)
+                        .execution_options(synchronize_session=False))
+    db.commit()
+    return result.rowcount > 0
+
+
+# Refresh Tokens
+def create_refresh_token(db: Session, user_id: int, token_hash: str, expires_at: datetime) -> None:
+    purge_refresh_tokens(db, user_id)
+    db.add(models.RefreshTokens(user_id=user_id, token_hash=token_hash, expires_at=expires_at))
+    db.commit()
+
+
+def rotate_refresh_token(db: Session, token_hash: str, new_token_hash: str,
+                         expires_at: datetime) -> Optional[tuple[int, str]]:
+    now = datetime.utcnow()
+    row = db.query(models.RefreshTokens.id, models.Users.id.label("user_id"), models.Users.username) \
+        .join(models.Users, models.Users.id == models.RefreshTokens.user_id) \
+        .filter(models.RefreshTokens.token_hash == token_hash,
+                models.RefreshTokens.revoked_at.is_(None),
+                models.RefreshTokens.expires_at > now,
+                models.Users.is_active.isnot(False),
+                models.Users.date_deactivated.is_(None)) \
+        .first()
+    if not row:
+        return None
+
+    # Conditional on still being unrevoked, so of two concurrent refreshes
+    # with the same token only one gets a new pair.
+    result = db.execute(update(models.RefreshTokens)
+                        .where(models.RefreshTokens.id == row.id, models.RefreshTokens.revoked_at.is_(None))
+                        .values(revoked_at=now)
+                        .execution_options(synchronize_session=False))
+    if result.rowcount == 0:
+        db.rollback()
+        return None
+
+    purge_refresh_tokens(db, row.user_id)
+    db.add(models.RefreshTokens(user_id=row.user_id, token_hash=new_token_hash, expires_at=expires_at))
+    db.commit()
+    return row.user_id, row.username
+
+
+def revoke_refresh_token(db: Session, token_hash: str) -> bool:
+    result = db.execute(update(models.RefreshTokens)
+                        .where(models.RefreshTokens.token_hash == token_hash,
+                               models.RefreshTokens.revoked_at.is_(None))
+                        .values(revoked_at=datetime.utcnow())
+                        .execution_options(synchronize_session=False))
+    db.commit()
+    return result.rowcount > 0
+
+
+def purge_refresh_tokens(db: Session, user_id: Optional[int] = None) -> int:
+    # Revoked and expired tokens can never be used again. Logins and rotations
+    # purge their own user's, `python migrate.py purge-refresh-tokens` everyone's.
+    query = delete(models.RefreshTokens) \
+        .where(or_(models.RefreshTokens.revoked_at.isnot(None), models.RefreshTokens.expires_at <= datetime.utcnow()))
+    if user_id is not None:
+        query = query.where(models.RefreshTokens.user_id == user_id)
+    return db.execute(query.execution_options(synchronize_session=False)).rowcount
+
+
+# Private Methods
+def sum_todo_stats(db: Session, key: Optional[ColumnElement] = None) -> list[dict[str, Any]]:
+    completed_todos = func.total(TODO_STATS.c.completed_todos)
+    # total() is 0.0 rather than NULL over no rows; TodoStats makes it an int.
+    query = select(func.total(TODO_STATS.c.todos).label("todos"),
+                   completed_todos.label("completed_todos"),
+                   (func.total(TODO_STATS.c.completion_seconds) / func.nullif(completed_todos, 0))
+                   .label("average_completion_seconds")) \
+        .where(TODO_STATS.c.todos > 0)
+    if key is not None:
+        query = query.add_columns(key).group_by(key).order_by(key)
+    return [row._asdict() for row in db.execute(query)]
+
+
+def search_expression(text: str) -> Optional[str]:
+    # Every word becomes a quoted prefix term, so user input can't inject FTS5
+    # syntax and "gro mil" finds "groceries: milk".
+    terms = SEARCH_TERM.findall(text)[:MAX_SEARCH_TERMS]
+    return " ".join(f'"{term}"*' for term in terms) or None
+
+
+def chunks(items: list[int], size: int) -> Iterator[list[int]]:
+    unique_items = list(dict.fromkeys(items))
+    for start in range(0, len(unique_items), size):
+        yield unique_items[start:start + size]
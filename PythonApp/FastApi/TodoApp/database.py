@@ -1,20 +1,158 @@
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
+import os
+from sqlalchemy import create_engine, event
+from starlette.concurrency import run_in_threadpool
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session, sessionmaker
 from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy.pool import QueuePool
+from typing import Any, AsyncIterator, Callable
+
+SQLALCHEMY_DATABASE_URL = os.environ.get("TODO_DATABASE_URL", "sqlite:///./todos.db")
+SQLALCHEMY_ASYNC_DATABASE_URL = SQLALCHEMY_DATABASE_URL.replace("sqlite://", "sqlite+aiosqlite://", 1)
+
+# Opt-in async engine, e.g. `TODO_ASYNC_DB=1 uvicorn main:app`
+ASYNC_DB_ENABLED = os.environ.get("TODO_ASYNC_DB", "0") == "1"
+
+# "default" keeps SQLite's own settings, "production" enables WAL and the tuning below.
+DB_PROFILE = os.environ.get("TODO_DB_PROFILE", "default")
+DB_SYNCHRONOUS = os.environ.get("TODO_DB_SYNCHRONOUS", "NORMAL").upper()
+DB_CACHE_SIZE = int(os.environ.get("TODO_DB_CACHE_SIZE", -64000))
+DB_MMAP_SIZE = int(os.environ.get("TODO_DB_MMAP_SIZE", 268435456))
+DB_BUSY_TIMEOUT_MS = int(os.environ.get("TODO_DB_BUSY_TIMEOUT_MS", 5000))
+DB_READ_POOL_SIZE = int(os.environ.get("TODO_DB_READ_POOL_SIZE", 5))
+
+if DB_PROFILE not in ("default", "production"):
+    raise ValueError(f"Unknown TODO_DB_PROFILE {DB_PROFILE!r}")
+if DB_SYNCHRONOUS not in ("OFF", "NORMAL", "FULL", "EXTRA"):
+    raise ValueError(f"Unknown TODO_DB_SYNCHRONOUS {DB_SYNCHRONOUS!r}")
+
+
+def apply_production_pragmas(engine: Engine, read_only: bool = False) -> None:
+    @event.listens_for(engine, "connect")
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute(f"PRAGMA synchronous={DB_SYNCHRONOUS}")
+        cursor.execute(f"PRAGMA cache_size={DB_CACHE_SIZE}")
+        cursor.execute(f"PRAGMA mmap_size={DB_MMAP_SIZE}")
+        cursor.execute(f"PRAGMA busy_timeout={DB_BUSY_TIMEOUT_MS}")
+        if read_only:
+            cursor.execute("PRAGMA query_only=1")
+        cursor.close()
 
-SQLALCHEMY_DATABASE_URL = "sqlite:///./todos.db"
 
 # Engine
-alchemy_engine = create_engine(
-    SQLALCHEMY_DATABASE_URL,
-    connect_args={"check_same_thread": False}
-)
+if DB_PROFILE == "production":
+    # SQLite allows a single writer, so writes share one pooled connection and
+    # queue in the pool instead of failing with `database is locked`.
+    alchemy_engine = create_engine(
+        SQLALCHEMY_DATABASE_URL,
+        connect_args={"check_same_thread": False},
+        poolclass=QueuePool,
+        pool_size=1,
+        max_overflow=0,
+        pool_timeout=DB_BUSY_TIMEOUT_MS / 1000
+    )
+    # WAL lets readers run alongside the writer on their own connections.
+    reader_engine = create_engine(
+        SQLALCHEMY_DATABASE_URL,
+        connect_args={"check_same_thread": False},
+        poolclass=QueuePool,
+        pool_size=DB_READ_POOL_SIZE,
+        max_overflow=DB_READ_POOL_SIZE
+    )
+    apply_production_pragmas(alchemy_engine)
+    apply_production_pragmas(reader_engine, read_only=True)
+else:
+    alchemy_engine = create_engine(
+        SQLALCHEMY_DATABASE_URL,
+        connect_args={"check_same_thread": False}
+    )
+    reader_engine = alchemy_engine
 
 # Session local instance
 # Using sessionmaker
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=alchemy_engine)
+ReadSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=reader_engine)
+
+# Async engines and sessions, only built when enabled so aiosqlite stays optional.
+async_engine = None
+async_reader_engine = None
+AsyncSessionLocal = None
+AsyncReadSessionLocal = None
+if ASYNC_DB_ENABLED:
+    from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+    from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+    if DB_PROFILE == "production":
+        # The same single writer and read-only reader split as the sync engines.
+        async_engine = create_async_engine(
+            SQLALCHEMY_ASYNC_DATABASE_URL,
+            poolclass=AsyncAdaptedQueuePool,
+            pool_size=1,
+            max_overflow=0,
+            pool_timeout=DB_BUSY_TIMEOUT_MS / 1000
+        )
+        async_reader_engine = create_async_engine(
+            SQLALCHEMY_ASYNC_DATABASE_URL,
+            poolclass=AsyncAdaptedQueuePool,
+            pool_size=DB_READ_POOL_SIZE,
+            max_overflow=DB_READ_POOL_SIZE
+        )
+        apply_production_pragmas(async_engine.sync_engine)
+        apply_production_pragmas(async_reader_engine.sync_engine, read_only=True)
+    else:
+        async_engine = create_async_engine(SQLALCHEMY_ASYNC_DATABASE_URL)
+        async_reader_engine = async_engine
+    AsyncSessionLocal = sessionmaker(class_=AsyncSession, autoflush=False, expire_on_commit=False,
+                                     bind=async_engine)
+    AsyncReadSessionLocal = sessionmaker(class_=AsyncSession, autoflush=False, expire_on_commit=False,
+                                         bind=async_reader_engine)
 
 # Declarative base
 Base = declarative_base()
 
 
+async def get_db() -> AsyncIterator[Any]:
+    if AsyncSessionLocal:
+        async with AsyncSessionLocal() as db:
+            yield db
+        return
+
+    db = SessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+async def get_read_db() -> AsyncIterator[Any]:
+    # Read-only endpoints use the reader pool when the production profile is on.
+    if AsyncReadSessionLocal:
+        async with AsyncReadSessionLocal() as db:
+            yield db
+        return
+
+    db = ReadSessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+async def run_db(db: Any, func: Callable[..., Any], *args) -> Any:
+    # Runs a function written against a sync Session on either engine. Sync
+    # sessions run in the threadpool, so waiting for a pooled connection (the
+    # single writer in production) never blocks the event loop.
+    if isinstance(db, Session):
+        return await run_in_threadpool(func, db, *args)
+    return await db.run_sync(func, *args)
+
+
+async def release_db(db: Any) -> None:
+    # Ends the session's transaction and hands its connection back to the
+    # pool. Call it before awaiting anything slow with the session still open.
+    if isinstance(db, Session):
+        db.close()
+    else:
+        await db.close()
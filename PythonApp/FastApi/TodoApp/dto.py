@@ -1,4 +1,6 @@
-from pydantic import BaseModel, Field
+from datetime import datetime
+from enum import Enum
+from pydantic import BaseModel, Field, validator
 from typing import Optional
 
 
@@ -17,4 +19,105 @@ class Todo(BaseModel):
                 "priority": 4,
                 "complete": False
             }
-        }
\ No newline at end of file
+        }
+
+
+class TodoBulkUpdate(BaseModel):
+    ids: list[int] = Field(min_items=1)
+    title: Optional[str]
+    description: Optional[str]
+    priority: Optional[int] = Field(None, gt=0, lt=6, description='The priority must be between 1 and 5.')
+    complete: Optional[bool]
+
+    # Optional means "leave unchanged"; only description may be set to null, as in Todo.
+    @validator("title", "priority", "complete", pre=True)
+    def reject_null(cls, value):
+        if value is None:
+            raise ValueError("may be omitted but not null")
+        return value
+
+    class Config:
+        schema_extra = {
+            "example": {
+                "ids": [1, 2, 3],
+                "complete": True
+            }
+        }
+
+
+class TodoFilters(BaseModel):
+    complete: Optional[bool]
+    priority: Optional[int]
+    created_after: Optional[datetime]
+    created_before: Optional[datetime]
+    completed_after: Optional[datetime]
+    completed_before: Optional[datetime]
+
+
+class Loading(str, Enum):
+    selectin = "selectin"
+    joined = "joined"
+    lazy = "lazy"
+
+
+class TodoOut(BaseModel):
+    id: int
+    title: str
+    description: Optional[str]
+    priority: int
+    complete: bool
+    date_created: Optional[datetime]
+    date_completed: Optional[datetime]
+    owner_id: Optional[int]
+
+    class Config:
+        orm_mode = True
+
+
+class UserOut(BaseModel):
+    id: int
+    username: str
+    email: Optional[str]
+    first_name: Optional[str]
+    last_name: Optional[str]
+    is_active: bool
+
+    class Config:
+        orm_mode = True
+
+
+class TodoPage(BaseModel):
+    todos: list[TodoOut]
+    next_cursor: Optional[str]
+
+
+class TodoWithOwner(TodoOut):
+    owner: Optional[UserOut]
+
+
+class UserWithTodos(UserOut):
+    todos: list[TodoOut]
+
+
+class TodoStatsGroup(BaseModel):
+    todos: int
+    completed_todos: int
+    average_completion_seconds: Optional[float]
+
+
+class PriorityStats(TodoStatsGroup):
+    priority: Optional[int]
+
+
+class CompleteStats(TodoStatsGroup):
+    complete: bool
+
+
+class OwnerStats(TodoStatsGroup):
+    owner_id: Optional[int]
+
+
+class TodoStats(TodoStatsGroup):
+    by_priority: list[PriorityStats]
+    by_complete: list[CompleteStats]
+    by_owner: list[OwnerStats]
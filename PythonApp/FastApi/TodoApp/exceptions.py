@@ -1,3 +1,4 @@
+import math
 from fastapi import HTTPException, status
 from sqlalchemy import exc
 
@@ -6,8 +7,22 @@ def http_not_found_exception(name: str) -> HTTPException:
     return HTTPException(status_code=404, detail=f'{name} not found')
 
 
+def invalid_cursor_exception() -> HTTPException:
+    return HTTPException(status_code=400, detail='Invalid pagination cursor')
+
+
+def empty_update_exception() -> HTTPException:
+    return HTTPException(status_code=400, detail='No fields to update')
+
+
+def invalid_bulk_body_exception() -> HTTPException:
+    return HTTPException(status_code=400, detail='Body must be a JSON array or NDJSON')
+
+
 def sqlalchemy_exception(error: exc.SQLAlchemyError) -> HTTPException:
-    return HTTPException(status_code=int(error.code) if error.code else 412, detail='error')
+    if is_database_busy(error):
+        return database_busy_exception()
+    return HTTPException(status_code=412, detail='error')
 
 
 def get_user_exception():
@@ -26,3 +41,49 @@ def get_token_exception():
         headers={"WWW-Authenticate": "Bearer"}
     )
     return token_exception
+
+
+def invalid_refresh_token_exception():
+    refresh_token_exception = HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Invalid or expired refresh token",
+        headers={"WWW-Authenticate": "Bearer"}
+    )
+    return refresh_token_exception
+
+
+def hashing_saturated_exception():
+    saturated_exception = HTTPException(
+        status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+        detail="Too many concurrent login requests",
+        headers={"Retry-After": "1"}
+    )
+    return saturated_exception
+
+
+def database_busy_exception():
+    busy_exception = HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail="Database busy, try again",
+        headers={"Retry-After": "1"}
+    )
+    return busy_exception
+
+
+def login_rate_limited_exception(retry_after: float):
+    rate_limited_exception = HTTPException(
+        status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+        detail="Too many login attempts",
+        headers={"Retry-After": str(max(1, math.ceil(min(retry_after, 3600))))}
+    )
+    return rate_limited_exception
+
+
+# Private Methods
+def is_database_busy(error: exc.SQLAlchemyError) -> bool:
+    # The writer pool timed out, or SQLite gave up on its lock after
+    # busy_timeout. Both pass once the current writer is done.
+    if isinstance(error, exc.TimeoutError):
+        return True
+    return isinstance(error, exc.OperationalError) and \
+        any(message in str(error.orig) for message in ("database is locked", "database table is locked"))
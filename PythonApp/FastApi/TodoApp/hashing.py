@@ -0,0 +1,152 @@
+import asyncio
+import math
+import os
+import threading
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Optional
+
+from exceptions import hashing_saturated_exception
+from instrumentation import record
+
+HASH_WORKERS = int(os.environ.get("TODO_HASH_WORKERS", os.cpu_count() or 1))
+HASH_QUEUE_LIMIT = int(os.environ.get("TODO_HASH_QUEUE_LIMIT", HASH_WORKERS * 4))
+HASH_USE_PROCESSES = os.environ.get("TODO_HASH_EXECUTOR", "thread") == "process"
+
+# Fixed bcrypt cost; when unset it is calibrated on first use against the target.
+BCRYPT_ROUNDS = int(os.environ["TODO_BCRYPT_ROUNDS"]) if os.environ.get("TODO_BCRYPT_ROUNDS") else None
+BCRYPT_TARGET_SECONDS = float(os.environ.get("TODO_BCRYPT_TARGET_MS", 250)) / 1000
+BCRYPT_MIN_ROUNDS = int(os.environ.get("TODO_BCRYPT_MIN_ROUNDS", 10))
+BCRYPT_MAX_ROUNDS = int(os.environ.get("TODO_BCRYPT_MAX_ROUNDS", 16))
+BCRYPT_PROBE_ROUNDS = 8
+
+_bcrypt_context = None
+_bcrypt_rounds = BCRYPT_ROUNDS
+_bcrypt_lock = threading.Lock()
+
+
+class HashingPool:
+    def __init__(self, workers: int, queue_limit: int, use_processes: bool = False):
+        self.workers = workers
+        self.queue_limit = queue_limit
+        self.use_processes = use_processes
+        self._executor: Executor | None = None
+        self._in_flight = 0
+
+        self.completed = 0
+        self.rejected = 0
+        self.queue_wait_seconds = 0.0
+        self.hash_seconds = 0.0
+
+    async def run(self, func: Callable[..., Any], *args) -> Any:
+        if self._in_flight >= self.workers + self.queue_limit:
+            self.rejected += 1
+            raise hashing_saturated_exception()
+
+        self._in_flight += 1
+        submitted = time.perf_counter()
+        try:
+            loop = asyncio.get_running_loop()
+            result, elapsed = await loop.run_in_executor(self._get_executor(), _timed, func, *args)
+        finally:
+            self._in_flight -= 1
+
+        record("bcrypt", elapsed)
+        self.completed += 1
+        self.hash_seconds += elapsed
+        self.queue_wait_seconds += max(time.perf_counter() - submitted - elapsed, 0.0)
+        return result
+
+    def stats(self) -> dict[str, int | float]:
+        return {
+            "workers": self.workers,
+            "queue_limit": self.queue_limit,
+            "in_flight": self._in_flight,
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "queue_wait_seconds": self.queue_wait_seconds,
+            "hash_seconds": self.hash_seconds
+        }
+
+    def shutdown(self) -> None:
+        if self._executor:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+    def _get_executor(self) -> Executor:
+        if not self._executor:
+            if self.use_processes:
+                # Settles the cost first so spawned workers inherit it, see get_bcrypt_context.
+                get_bcrypt_context()
+            executor_class = ProcessPoolExecutor if self.use_processes else ThreadPoolExecutor
+            self._executor = executor_class(max_workers=self.workers)
+        return self._executor
+
+
+hashing_pool = HashingPool(HASH_WORKERS, HASH_QUEUE_LIMIT, HASH_USE_PROCESSES)
+
+
+def calibrate_bcrypt_rounds(target_seconds: float, min_rounds: int, max_rounds: int) -> int:
+    # Each extra round doubles the cost, so one cheap probe is enough to
+    # extrapolate the highest cost that still fits the target.
+    from passlib.hash import bcrypt
+
+    probe_seconds = min(_timed(bcrypt.using(rounds=BCRYPT_PROBE_ROUNDS).hash, "calibration")[1] for _ in range(3))
+    rounds = BCRYPT_PROBE_ROUNDS + math.floor(math.log2(target_seconds / probe_seconds))
+    return max(min_rounds, min(max_rounds, rounds))
+
+
+def get_bcrypt_context():
+    # passlib and its bcrypt backend load here, on first use or in the startup
+    # warm-up, not on import. Concurrent first callers wait for the calibration
+    # so no hash is made under a provisional cost.
+    global _bcrypt_context
+    if _bcrypt_context is None:
+        with _bcrypt_lock:
+            if _bcrypt_context is None:
+                from passlib.context import CryptContext
+
+                context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+                rounds = _bcrypt_rounds or calibrate_bcrypt_rounds(BCRYPT_TARGET_SECONDS, BCRYPT_MIN_ROUNDS,
+                                                                   BCRYPT_MAX_ROUNDS)
+                _pin_rounds(context, rounds)
+                # Spawned hashing processes read it back as BCRYPT_ROUNDS.
+                os.environ["TODO_BCRYPT_ROUNDS"] = str(rounds)
+                _bcrypt_context = context
+    return _bcrypt_context
+
+
+def bcrypt_rounds() -> int:
+    return get_bcrypt_context().handler("bcrypt").default_rounds
+
+
+def set_bcrypt_rounds(rounds: int) -> None:
+    global _bcrypt_rounds
+    _bcrypt_rounds = rounds
+    if _bcrypt_context is not None:
+        _pin_rounds(_bcrypt_context, rounds)
+
+
+def get_password_hash(password) -> str:
+    return get_bcrypt_context().hash(password)
+
+
+def verify_password(pw: str, hash_pw: str) -> tuple[bool, Optional[str]]:
+    return get_bcrypt_context().verify_and_update(pw, hash_pw)
+
+
+# Private Methods
+def _timed(func: Callable[..., Any], *args) -> tuple[Any, float]:
+    # Runs inside the worker, so the elapsed time excludes queueing.
+    started = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - started
+
+
+def _pin_rounds(context, rounds: int) -> None:
+    # Pinning the minimum makes verify_and_update upgrade weaker hashes. The
+    # maximum is bcrypt's own, as passlib would otherwise cap it at the default
+    # and weaken hashes made on a node that calibrated higher.
+    from passlib.hash import bcrypt
+
+    context.update(bcrypt__rounds=rounds, bcrypt__min_rounds=rounds, bcrypt__max_rounds=bcrypt.max_rounds)
@@ -0,0 +1,161 @@
+import os
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator, Optional
+
+from fastapi import FastAPI, Request, Response
+from fastapi.responses import PlainTextResponse
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from starlette.routing import Match
+
+from database import alchemy_engine, async_engine, async_reader_engine, reader_engine
+
+# Off by default; when off no middleware or SQL hooks are installed and
+# `timed`/`record` reduce to a flag check.
+# Set in test and benchmark runs to fail any request that issues more SQL
+# statements than this, which is how N+1 loading regressions show up.
+MAX_QUERIES_PER_REQUEST = int(os.environ["TODO_MAX_QUERIES_PER_REQUEST"]) \
+    if os.environ.get("TODO_MAX_QUERIES_PER_REQUEST") else None
+INSTRUMENTATION_ENABLED = os.environ.get("TODO_INSTRUMENTATION", "0") == "1" or MAX_QUERIES_PER_REQUEST is not None
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 25, 50, 100)
+
+# Per request: name -> [calls, seconds]
+request_timings: ContextVar[Optional[dict[str, list]]] = ContextVar("request_timings", default=None)
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+class Histogram:
+    def __init__(self, name: str, description: str, buckets: tuple):
+        self.name = name
+        self.description = description
+        self.buckets = buckets
+        # labels -> (bucket counts, sum, count)
+        self._series: dict[tuple[tuple[str, str], ...], list] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = tuple(sorted(labels.items()))
+        series = self._series.get(key)
+        if series is None:
+            series = self._series[key] = [[0] * len(self.buckets), 0.0, 0]
+        index = bisect_left(self.buckets, value)
+        if index < len(self.buckets):
+            series[0][index] += 1
+        series[1] += value
+        series[2] += 1
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} histogram"]
+        for key, (bucket_counts, total, count) in self._series.items():
+            labels = ",".join(f'{name}="{value}"' for name, value in key)
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, bucket_counts):
+                cumulative += bucket_count
+                lines.append(f'{self.name}_bucket{{{labels}{"," if labels else ""}le="{bound}"}} {cumulative}')
+            lines.append(f'{self.name}_bucket{{{labels}{"," if labels else ""}le="+Inf"}} {count}')
+            lines.append(f"{self.name}_sum{{{labels}}} {total}")
+            lines.append(f"{self.name}_count{{{labels}}} {count}")
+        return lines
+
+
+REQUEST_DURATION = Histogram("todo_request_duration_seconds", "Wall time per request.", LATENCY_BUCKETS)
+SQL_QUERIES = Histogram("todo_request_sql_queries", "SQL statements issued per request.", COUNT_BUCKETS)
+SQL_DURATION = Histogram("todo_request_sql_duration_seconds", "Time spent in SQL per request.", LATENCY_BUCKETS)
+BCRYPT_DURATION = Histogram("todo_request_bcrypt_duration_seconds", "Time spent hashing or verifying passwords "
+                                                                    "per request.", LATENCY_BUCKETS)
+JWT_DURATION = Histogram("todo_request_jwt_duration_seconds", "Time spent decoding tokens per request.",
+                         LATENCY_BUCKETS)
+HISTOGRAMS = (REQUEST_DURATION, SQL_QUERIES, SQL_DURATION, BCRYPT_DURATION, JWT_DURATION)
+
+
+def record(name: str, seconds: float) -> None:
+    timings = request_timings.get()
+    if timings is not None:
+        entry = timings.setdefault(name, [0, 0.0])
+        entry[0] += 1
+        entry[1] += seconds
+
+
+@contextmanager
+def timed(name: str) -> Iterator[None]:
+    if not INSTRUMENTATION_ENABLED:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(name, time.perf_counter() - started)
+
+
+def instrument(app: FastAPI) -> None:
+    @app.get("/metrics", response_class=PlainTextResponse)
+    async def read_metrics() -> str:
+        return "\n".join(line for histogram in HISTOGRAMS for line in histogram.render()) + "\n"
+
+    if INSTRUMENTATION_ENABLED:
+        app.middleware("http")(timing_middleware)
+
+
+async def timing_middleware(request: Request, call_next) -> Response:
+    timings: dict[str, list] = {}
+    token = request_timings.set(timings)
+    started = time.perf_counter()
+    try:
+        response = await call_next(request)
+    finally:
+        request_timings.reset(token)
+    elapsed = time.perf_counter() - started
+
+    route = route_template(request)
+    sql_calls, sql_seconds = timings.get("sql", (0, 0.0))
+    REQUEST_DURATION.observe(elapsed, method=request.method, route=route, status=str(response.status_code))
+    SQL_QUERIES.observe(sql_calls, route=route)
+    SQL_DURATION.observe(sql_seconds, route=route)
+    if "bcrypt" in timings:
+        BCRYPT_DURATION.observe(timings["bcrypt"][1], route=route)
+    if "jwt" in timings:
+        JWT_DURATION.observe(timings["jwt"][1], route=route)
+
+    if MAX_QUERIES_PER_REQUEST is not None and sql_calls > MAX_QUERIES_PER_REQUEST:
+        raise QueryBudgetExceeded(f"{request.method} {route} issued {sql_calls} SQL statements, "
+                                  f"the budget is {MAX_QUERIES_PER_REQUEST}")
+
+    server_timing = [f"app;dur={elapsed * 1000:.2f}"]
+    for name, (calls, seconds) in timings.items():
+        server_timing.append(f'{name};dur={seconds * 1000:.2f};desc="{calls} calls"')
+    response.headers["Server-Timing"] = ", ".join(server_timing)
+    return response
+
+
+def route_template(request: Request) -> str:
+    for route in request.app.routes:
+        match, _ = route.matches(request.scope)
+        if match == Match.FULL:
+            return route.path
+    return "unmatched"
+
+
+def instrument_engine(engine: Engine) -> None:
+    @event.listens_for(engine, "before_cursor_execute")
+    def start_query_timer(connection, cursor, statement, parameters, context, executemany):
+        connection.info.setdefault("query_started", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def stop_query_timer(connection, cursor, statement, parameters, context, executemany):
+        record("sql", time.perf_counter() - connection.info["query_started"].pop())
+
+
+if INSTRUMENTATION_ENABLED:
+    for instrumented_engine in {alchemy_engine, reader_engine}:
+        instrument_engine(instrumented_engine)
+    if async_engine:
+        for instrumented_engine in {async_engine, async_reader_engine}:
+            instrument_engine(instrumented_engine.sync_engine)
@@ -1,97 +1,276 @@
-from database import alchemy_engine, SessionLocal
-from fastapi import Depends, FastAPI
-from sqlalchemy import exc
+import json
+from datetime import datetime
+from database import ReadSessionLocal, get_db, get_read_db, run_db
+from fastapi import APIRouter, Depends, FastAPI, Query, Request
+from fastapi.responses import StreamingResponse
+from sqlalchemy import exc, select
 from sqlalchemy.orm import Session
-from typing import Dict
+from pydantic import ValidationError
+from typing import Any, AsyncIterator, Iterator, Optional
 
 # Custom Modules
-from dto import Todo
-from exceptions import http_not_found_exception, sqlalchemy_exception
+from auth import get_current_user, get_optional_user
+from dto import Loading, Todo, TodoBulkUpdate, TodoFilters, TodoOut, TodoPage, TodoStats, UserWithTodos
+from exceptions import empty_update_exception, http_not_found_exception, invalid_bulk_body_exception, \
+    sqlalchemy_exception
+from instrumentation import instrument
+from pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, STREAM_CHUNK_SIZE, decode_cursor, decode_offset_cursor, \
+    encode_cursor, encode_offset_cursor
 from responses import successful_response
+from serialization import FastJSONResponse, dumps
+from startup import lifespan, router as startup_router
+import crud
 import models
 
-app = FastAPI()
+router = APIRouter()
 
-models.Base.metadata.create_all(bind=alchemy_engine)
 
+@router.get("/", response_model=TodoPage)
+async def read_all(cursor: Optional[str] = None,
+                   limit: int = Query(DEFAULT_PAGE_SIZE, gt=0, le=MAX_PAGE_SIZE),
+                   stream: bool = False,
+                   db: Session = Depends(get_read_db)) -> FastJSONResponse | StreamingResponse:
+    after_id = decode_cursor(cursor)
 
-def get_db():
-    db = None
-    try:
-        db = SessionLocal()
-        yield db
-    finally:
-        db.close()
+    if stream:
+        return StreamingResponse(stream_todos(after_id), media_type="application/x-ndjson")
+
+    # Fetch one extra row to know whether another page exists.
+    todos = await run_db(db, crud.read_todos_page, after_id, limit + 1)
+    next_cursor = encode_cursor(todos[limit - 1]["id"]) if len(todos) > limit else None
+    return FastJSONResponse({"todos": todos[:limit], "next_cursor": next_cursor})
+
+
+@router.get("/todos/user", response_model=TodoPage)
+async def read_all_by_user(complete: Optional[bool] = None,
+                           priority: Optional[int] = Query(None, gt=0, lt=6),
+                           created_after: Optional[datetime] = None,
+                           created_before: Optional[datetime] = None,
+                           completed_after: Optional[datetime] = None,
+                           completed_before: Optional[datetime] = None,
+                           cursor: Optional[str] = None,
+                           limit: int = Query(DEFAULT_PAGE_SIZE, gt=0, le=MAX_PAGE_SIZE),
+                           user: dict = Depends(get_current_user),
+                           db: Session = Depends(get_read_db)) -> FastJSONResponse:
+    filters = TodoFilters(complete=complete,
+                          priority=priority,
+                          created_after=created_after,
+                          created_before=created_before,
+                          completed_after=completed_after,
+                          completed_before=completed_before)
+
+    todos = await run_db(db, crud.read_owner_todos_page, user["id"], filters, decode_cursor(cursor), limit + 1)
+    next_cursor = encode_cursor(todos[limit - 1]["id"]) if len(todos) > limit else None
+    return FastJSONResponse({"todos": todos[:limit], "next_cursor": next_cursor})
+
+
+@router.get("/todos/with-owner")
+async def read_all_with_owner(cursor: Optional[str] = None,
+                              limit: int = Query(DEFAULT_PAGE_SIZE, gt=0, le=MAX_PAGE_SIZE),
+                              loading: Loading = crud.RELATIONSHIP_LOADING,
+                              db: Session = Depends(get_read_db)) -> dict:
+    todos = await run_db(db, crud.read_todos_with_owner_page, decode_cursor(cursor), limit + 1, loading)
+    next_cursor = encode_cursor(todos[limit - 1].id) if len(todos) > limit else None
+    return {"todos": todos[:limit], "next_cursor": next_cursor}
+
+
+@router.get("/users/me")
+async def read_current_user(loading: Loading = crud.RELATIONSHIP_LOADING,
+                            user: dict = Depends(get_current_user),
+                            db: Session = Depends(get_read_db)) -> UserWithTodos:
+    user_with_todos = await run_db(db, crud.read_user_with_todos, user["id"], loading)
+
+    if user_with_todos:
+        return user_with_todos
+    raise http_not_found_exception("User")
+
+
+@router.get("/todos/search", response_model=TodoPage)
+async def search_todos(q: str = Query(..., min_length=1, max_length=200),
+                       cursor: Optional[str] = None,
+                       limit: int = Query(DEFAULT_PAGE_SIZE, gt=0, le=MAX_PAGE_SIZE),
+                       db: Session = Depends(get_read_db)) -> FastJSONResponse:
+    offset = decode_offset_cursor(cursor)
 
+    todos = await run_db(db, crud.search_todos_page, q, offset, limit + 1)
+    next_cursor = encode_offset_cursor(offset + limit) if len(todos) > limit else None
+    return FastJSONResponse({"todos": todos[:limit], "next_cursor": next_cursor})
 
-@app.get("/")
-async def read_all(db: Session = Depends(get_db)) -> Dict[int, models.Todos]:
-    return db.query(models.Todos).all()
 
+@router.get("/todos/stats")
+async def read_todo_stats(db: Session = Depends(get_read_db)) -> TodoStats:
+    return await run_db(db, crud.read_todo_stats)
 
-@app.get("/todos/{todo_id}")
-async def read_todo(todo_id: int, db: Session = Depends(get_db)) -> models.Todos:
-    todo = db.query(models.Todos) \
-        .filter(models.Todos.id == todo_id) \
-        .first()
+
+@router.get("/todos/{todo_id}", response_model=TodoOut)
+async def read_todo(todo_id: int, db: Session = Depends(get_read_db)) -> FastJSONResponse:
+    todo = await run_db(db, crud.read_todo, todo_id)
 
     if todo:
-        return todo
+        return FastJSONResponse(todo)
     raise http_not_found_exception("Todo")
 
 
-@app.post("/")
-async def create_todo(todo: Todo, db: Session = Depends(get_db)) -> dict[str, str | int]:
-    todo_model = models.Todos()
-    todo_model.title = todo.title
-    todo_model.description = todo.description
-    todo_model.priority = todo.priority
-    todo_model.complete = todo.complete
-
+@router.post("/")
+async def create_todo(todo: Todo,
+                      user: Optional[dict] = Depends(get_optional_user),
+                      db: Session = Depends(get_db)) -> dict[str, str | int]:
     try:
-        db.add(todo_model)
-        db.commit()
+        await run_db(db, crud.create_todo, todo, user["id"] if user else None)
     except exc.SQLAlchemyError as error:
         raise sqlalchemy_exception(error)
     return successful_response(201)
 
 
-@app.put("/todos/{todo_id}")
-async def update_todo(todo_id: int, todo: Todo, db: Session = Depends(get_db)) -> dict[str, str | int]:
-    old_todo: models.Todos = db.query(models.Todos)\
-        .filter(models.Todos.id == todo_id)\
-        .first()
+@router.post("/todos/bulk", status_code=201)
+async def create_todos(request: Request,
+                       batch_size: int = Query(crud.BULK_INSERT_BATCH_SIZE, gt=0, le=crud.MAX_BULK_INSERT_BATCH_SIZE),
+                       user: Optional[dict] = Depends(get_optional_user),
+                       db: Session = Depends(get_db)) -> dict[str, Any]:
+    owner_id = user["id"] if user else None
+    if "ndjson" in request.headers.get("content-type", ""):
+        items = read_ndjson_items(request)
+    else:
+        items = read_json_array_items(request)
 
-    if not old_todo:
-        raise http_not_found_exception("Todo")
+    created = 0
+    failures = []
+    batch = []
+
+    async def insert_batch() -> None:
+        nonlocal created
+        try:
+            batch_failures = await run_db(db, crud.insert_todos, [row for _, row in batch])
+        except exc.SQLAlchemyError as error:
+            raise sqlalchemy_exception(error)
+        for position, error in batch_failures:
+            failures.append({"index": batch[position][0], "errors": [error]})
+        created += len(batch) - len(batch_failures)
+        batch.clear()
+
+    async for index, item, error in items:
+        if error:
+            failures.append({"index": index, "errors": [error]})
+            continue
+        try:
+            batch.append((index, {**Todo.parse_obj(item).dict(), "owner_id": owner_id}))
+        except ValidationError as validation_error:
+            failures.append({"index": index, "errors": validation_error.errors()})
+            continue
+        if len(batch) >= batch_size:
+            await insert_batch()
+
+    if batch:
+        await insert_batch()
+    return {**successful_response(201), "created": created, "failed": failures}
 
-    old_todo.title = todo.title
-    old_todo.description = todo.description
-    old_todo.priority = todo.priority
-    old_todo.complete = todo.complete
 
+@router.put("/todos/{todo_id}")
+async def update_todo(todo_id: int, todo: Todo, db: Session = Depends(get_db)) -> dict[str, str | int]:
     try:
-        db.add(old_todo)
-        db.commit()
+        updated = await run_db(db, crud.update_todo, todo_id, todo)
     except exc.SQLAlchemyError as error:
         raise sqlalchemy_exception(error)
+
+    if not updated:
+        raise http_not_found_exception("Todo")
     return successful_response(200)
 
 
-@app.delete("/todos/{todo_id}")
+@router.delete("/todos/{todo_id}")
 async def delete_todo(todo_id: int, db: Session = Depends(get_db)) -> dict[str, str | int]:
-    old_todo: models.Todos = db.query(models.Todos)\
-        .filter(models.Todos.id == todo_id)\
-        .first()
+    try:
+        deleted = await run_db(db, crud.delete_todo, todo_id)
+    except exc.SQLAlchemyError as error:
+        raise sqlalchemy_exception(error)
 
-    if not old_todo:
+    if not deleted:
         raise http_not_found_exception("Todo")
+    return successful_response(200)
+
+
+@router.patch("/todos")
+async def update_todos(todo_update: TodoBulkUpdate, db: Session = Depends(get_db)) -> dict[str, str | int | list[int]]:
+    values = todo_update.dict(exclude_unset=True, exclude={"ids"})
+    if not values:
+        raise empty_update_exception()
 
     try:
-        db.query(models.Todos)\
-            .filter(models.Todos.id == todo_id)\
-            .delete()
-        db.commit()
+        updated_ids = await run_db(db, crud.update_todos, todo_update.ids, values)
     except exc.SQLAlchemyError as error:
         raise sqlalchemy_exception(error)
-    return successful_response(200)
+    return bulk_response(todo_update.ids, updated_ids)
+
+
+@router.delete("/todos")
+async def delete_todos(ids: list[int] = Query(...), db: Session = Depends(get_db)) -> dict[str, str | int | list[int]]:
+    try:
+        deleted_ids = await run_db(db, crud.delete_todos, ids)
+    except exc.SQLAlchemyError as error:
+        raise sqlalchemy_exception(error)
+    return bulk_response(ids, deleted_ids)
+
+
+# Private Methods
+def bulk_response(requested_ids: list[int], affected_ids: list[int]) -> dict[str, str | int | list[int]]:
+    affected = set(affected_ids)
+    return {
+        **successful_response(200),
+        'affected': sorted(affected),
+        'not_found': sorted(set(requested_ids) - affected)
+    }
+
+
+async def read_json_array_items(request: Request) -> AsyncIterator[tuple[int, Any, Optional[str]]]:
+    try:
+        body = await request.json()
+    except ValueError:
+        raise invalid_bulk_body_exception()
+    if not isinstance(body, list):
+        raise invalid_bulk_body_exception()
+
+    for index, item in enumerate(body):
+        yield index, item, None
+
+
+async def read_ndjson_items(request: Request) -> AsyncIterator[tuple[int, Any, Optional[str]]]:
+    # Parses the body line by line as it arrives instead of buffering it whole.
+    index = 0
+    buffer = b""
+    async for chunk in request.stream():
+        *lines, buffer = (buffer + chunk).split(b"\n")
+        for line in lines:
+            if line.strip():
+                yield parse_ndjson_line(index, line)
+                index += 1
+    if buffer.strip():
+        yield parse_ndjson_line(index, buffer)
+
+
+def parse_ndjson_line(index: int, line: bytes) -> tuple[int, Any, Optional[str]]:
+    try:
+        return index, json.loads(line), None
+    except ValueError as error:
+        return index, None, f"Invalid JSON: {error}"
+
+
+def stream_todos(after_id: Optional[int]) -> Iterator[bytes]:
+    # The stream outlives the request scoped session, so it owns its own.
+    db = ReadSessionLocal()
+    try:
+        statement = select(*crud.TODO_COLUMNS).order_by(models.Todos.id)
+        if after_id is not None:
+            statement = statement.where(models.Todos.id > after_id)
+
+        result = db.execute(statement.execution_options(stream_results=True))
+        for rows in result.partitions(STREAM_CHUNK_SIZE):
+            yield b"".join(dumps(dict(row._mapping)) + b"\n" for row in rows)
+    finally:
+        db.close()
+
+
+# Standalone app, see app.py for the combined one.
+app = FastAPI(lifespan=lifespan)
+instrument(app)
+app.include_router(router)
+app.include_router(startup_router)
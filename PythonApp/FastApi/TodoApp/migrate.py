@@ -0,0 +1,294 @@
+import argparse
+import importlib
+import logging
+import os
+import re
+import socket
+import sys
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Callable, Iterator, NamedTuple, Optional, Sequence
+
+from sqlalchemy.engine import Connection, Engine
+
+from database import alchemy_engine
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "migrations")
+MIGRATION_FILE = re.compile(r"^(\d{4})_(\w+)\.py$")
+
+# Backfills run in short transactions of this many rows, pausing in between so
+# application writes get the lock.
+MIGRATION_BATCH_SIZE = int(os.environ.get("TODO_MIGRATION_BATCH_SIZE", 5000))
+MIGRATION_BATCH_PAUSE = float(os.environ.get("TODO_MIGRATION_BATCH_PAUSE_MS", 10)) / 1000
+# How long a process waits for another one that is already migrating.
+MIGRATION_LOCK_TIMEOUT = float(os.environ.get("TODO_MIGRATION_LOCK_TIMEOUT", 600))
+# A lock not refreshed for this long is taken over. The holder refreshes it
+# between steps, so this only has to outlast the longest single statement
+# (an index build); a holder on the same host that died is noticed at once.
+MIGRATION_LOCK_EXPIRY = float(os.environ.get("TODO_MIGRATION_LOCK_EXPIRY", 3600))
+PROGRESS_INTERVAL = 1.0
+
+logger = logging.getLogger(__name__)
+
+
+class Migration(NamedTuple):
+    version: int
+    name: str
+    upgrade: Callable[["MigrationContext"], None]
+
+
+class MigrationContext:
+    # Schema helpers for migration scripts. Every helper checks the current
+    # schema first, so a step interrupted half way can simply be run again.
+    def __init__(self, engine: Engine, report: Callable[[str], None],
+                 heartbeat: Callable[[], None] = lambda: None):
+        self.engine = engine
+        self.report = report
+        self.heartbeat = heartbeat
+
+    def execute(self, sql: str, parameters: Optional[dict] = None) -> None:
+        with self.engine.begin() as connection:
+            connection.exec_driver_sql(sql, parameters or {})
+
+    def has_table(self, table: str) -> bool:
+        with self.engine.connect() as connection:
+            return bool(connection.exec_driver_sql(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (table,)).first())
+
+    def has_column(self, table: str, column: str) -> bool:
+        with self.engine.connect() as connection:
+            return any(row[1] == column for row in connection.exec_driver_sql(f"PRAGMA table_info({table})"))
+
+    def has_index(self, name: str) -> bool:
+        with self.engine.connect() as connection:
+            return bool(connection.exec_driver_sql(
+                "SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = ?", (name,)).first())
+
+    def create_index(self, name: str, table: str, columns: list[str], unique: bool = False) -> None:
+        # SQLite builds an index in one statement. Under WAL readers carry on
+        # meanwhile and writers queue on busy_timeout.
+        if self.has_index(name):
+            self.report(f"index {name} already exists")
+            return
+
+        self.report(f"building index {name} on {table} ({self.count_rows(table)} rows)")
+        self.execute_with_progress(f"CREATE {'UNIQUE ' if unique else ''}INDEX IF NOT EXISTS {name} "
+                                   f"ON {table} ({', '.join(columns)})", f"building index {name}")
+
+    def execute_with_progress(self, sql: str | Sequence[str], description: str) -> None:
+        # For statements that can't be batched, reports from SQLite's progress
+        # handler while they run. Several statements share one transaction.
+        statements = [sql] if isinstance(sql, str) else sql
+        started = time.perf_counter()
+        with self.engine.begin() as connection:
+            with progress_handler(connection, lambda: self.report(
+                    f"{description}, {time.perf_counter() - started:.0f}s elapsed")):
+                for sql in statements:
+                    connection.exec_driver_sql(sql)
+        self.report(f"{description} done in {time.perf_counter() - started:.1f}s")
+
+    def add_column(self, table: str, column: str, definition: str, backfill: Optional[str] = None) -> None:
+        # ADD COLUMN only rewrites the schema, not the rows. The optional
+        # backfill expression is then applied in batches of rowids, each in
+        # its own transaction, so the table is never locked for long.
+        if not self.has_column(table, column):
+            self.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+            self.report(f"added column {table}.{column}")
+        if backfill:
+            self.backfill(table, f"{column} = {backfill}", f"{column} IS NULL")
+
+    def backfill(self, table: str, assignment: str, condition: str = "1") -> None:
+        with self.engine.connect() as connection:
+            first, last = connection.exec_driver_sql(f"SELECT min(rowid), max(rowid) FROM {table}").one()
+        if first is None:
+            return
+
+        total = last - first + 1
+        for start in range(first, last + 1, MIGRATION_BATCH_SIZE):
+            end = min(start + MIGRATION_BATCH_SIZE - 1, last)
+            self.execute(f"UPDATE {table} SET {assignment} WHERE rowid BETWEEN :start AND :end AND ({condition})",
+                         {"start": start, "end": end})
+            self.report(f"backfilled {table} {end - first + 1}/{total} rowids")
+            self.heartbeat()
+            time.sleep(MIGRATION_BATCH_PAUSE)
+
+    def count_rows(self, table: str) -> int:
+        with self.engine.connect() as connection:
+            return connection.exec_driver_sql(f"SELECT count(*) FROM {table}").scalar()
+
+
+def discover_migrations() -> list[Migration]:
+    migrations = []
+    for file_name in sorted(os.listdir(MIGRATIONS_DIR)):
+        match = MIGRATION_FILE.match(file_name)
+        if match:
+            module = importlib.import_module(f"migrations.{file_name[:-3]}")
+            migrations.append(Migration(int(match.group(1)), match.group(2), module.upgrade))
+    return migrations
+
+
+def applied_versions(engine: Engine) -> set[int]:
+    with engine.begin() as connection:
+        create_bookkeeping_tables(connection)
+        return {row[0] for row in connection.exec_driver_sql("SELECT version FROM schema_migrations")}
+
+
+def pending_migrations(engine: Engine = alchemy_engine) -> list[Migration]:
+    applied = applied_versions(engine)
+    return [migration for migration in discover_migrations() if migration.version not in applied]
+
+
+def upgrade(engine: Engine = alchemy_engine, target: Optional[int] = None,
+            report: Callable[[str], None] = logger.info) -> list[int]:
+    # Safe to call from every process at startup: one takes the lock and
+    # migrates while the others wait and then find nothing left to do.
+    with migration_lock(engine) as heartbeat:
+        upgraded = []
+        for migration in pending_migrations(engine):
+            if target is not None and migration.version > target:
+                break
+            report(f"applying {migration.version:04d}_{migration.name}")
+            started = time.perf_counter()
+            migration.upgrade(MigrationContext(engine, report, heartbeat))
+            with engine.begin() as connection:
+                connection.exec_driver_sql(
+                    "INSERT INTO schema_migrations (version, name, applied_at) VALUES (?, ?, datetime('now'))",
+                    (migration.version, migration.name))
+            report(f"applied {migration.version:04d}_{migration.name} in {time.perf_counter() - started:.1f}s")
+            upgraded.append(migration.version)
+            heartbeat()
+        return upgraded
+
+
+# Private Methods
+def create_bookkeeping_tables(connection: Connection) -> None:
+    connection.exec_driver_sql("CREATE TABLE IF NOT EXISTS schema_migrations "
+                               "(version INTEGER PRIMARY KEY, name VARCHAR, applied_at DATETIME)")
+    connection.exec_driver_sql("CREATE TABLE IF NOT EXISTS schema_migration_lock "
+                               "(id INTEGER PRIMARY KEY CHECK (id = 1), owner VARCHAR, acquired_at DATETIME)")
+
+
+@contextmanager
+def migration_lock(engine: Engine) -> Iterator[Callable[[], None]]:
+    # Yields a heartbeat that refreshes the lock and fails if it was taken over.
+    owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+    deadline = time.monotonic() + MIGRATION_LOCK_TIMEOUT
+    while True:
+        with engine.begin() as connection:
+            create_bookkeeping_tables(connection)
+            clear_stale_lock(connection)
+            acquired = connection.exec_driver_sql("INSERT OR IGNORE INTO schema_migration_lock "
+                                                  "(id, owner, acquired_at) VALUES (1, ?, datetime('now'))",
+                                                  (owner,)).rowcount
+        if acquired:
+            break
+        if time.monotonic() > deadline:
+            raise TimeoutError("Timed out waiting for another process to finish migrating; "
+                               "if none is running, clear the lock with `python migrate.py unlock`")
+        time.sleep(0.5)
+
+    def heartbeat() -> None:
+        with engine.begin() as connection:
+            refreshed = connection.exec_driver_sql("UPDATE schema_migration_lock SET acquired_at = datetime('now') "
+                                                   "WHERE owner = ?", (owner,)).rowcount
+        if not refreshed:
+            raise RuntimeError("The migration lock expired and was taken over by another process")
+
+    try:
+        yield heartbeat
+    finally:
+        with engine.begin() as connection:
+            connection.exec_driver_sql("DELETE FROM schema_migration_lock WHERE owner = ?", (owner,))
+
+
+def clear_stale_lock(connection: Connection) -> None:
+    lock = connection.exec_driver_sql("SELECT owner, (julianday('now') - julianday(acquired_at)) * 86400 "
+                                      "FROM schema_migration_lock").first()
+    if lock and (lock_owner_died(lock[0]) or lock[1] > MIGRATION_LOCK_EXPIRY):
+        logger.warning("Taking over the migration lock of %s, last refreshed %.0fs ago", lock[0], lock[1])
+        connection.exec_driver_sql("DELETE FROM schema_migration_lock WHERE owner = ?", (lock[0],))
+
+
+def lock_owner_died(owner: str) -> bool:
+    # Only processes on this host can be checked; others wait for the expiry.
+    host, _, pid = owner.rpartition(":")[0].rpartition(":")
+    if os.name != "posix" or host != socket.gethostname() or not pid.isdigit():
+        return False
+    try:
+        os.kill(int(pid), 0)
+    except ProcessLookupError:
+        return True
+    except PermissionError:
+        pass
+    return False
+
+
+@contextmanager
+def progress_handler(connection: Connection, report: Callable[[], None]) -> Iterator[None]:
+    dbapi_connection = connection.connection.driver_connection
+    if not hasattr(dbapi_connection, "set_progress_handler"):
+        yield
+        return
+
+    last_report = time.monotonic()
+
+    def tick() -> int:
+        nonlocal last_report
+        if time.monotonic() - last_report >= PROGRESS_INTERVAL:
+            last_report = time.monotonic()
+            report()
+        return 0
+
+    dbapi_connection.set_progress_handler(tick, 100000)
+    try:
+        yield
+    finally:
+        dbapi_connection.set_progress_handler(None, 0)
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Apply TodoApp schema migrations and database maintenance.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    upgrade_parser = commands.add_parser("upgrade", help="apply pending migrations")
+    upgrade_parser.add_argument("--target", type=int, help="stop after this version")
+    commands.add_parser("status", help="list applied and pending migrations")
+    commands.add_parser("unlock", help="clear the lock left by a migration that crashed")
+    commands.add_parser("rebuild-stats", help="recount the todo_stats summary from the todos table")
+    commands.add_parser("purge-refresh-tokens", help="delete revoked and expired refresh tokens")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+    if args.command == "upgrade":
+        upgraded = upgrade(target=args.target)
+        print(f"applied {len(upgraded)} migrations" if upgraded else "schema is up to date")
+    elif args.command == "status":
+        applied = applied_versions(alchemy_engine)
+        for migration in discover_migrations():
+            print(f"{migration.version:04d}_{migration.name}: {'applied' if migration.version in applied else 'pending'}")
+    elif args.command == "rebuild-stats":
+        # A full scan of todos, so kept off the HTTP API.
+        import crud
+        from database import SessionLocal
+
+        started = time.perf_counter()
+        with SessionLocal() as db:
+            crud.rebuild_todo_stats(db)
+        print(f"rebuilt todo_stats in {time.perf_counter() - started:.1f}s")
+    elif args.command == "purge-refresh-tokens":
+        import crud
+        from database import SessionLocal
+
+        with SessionLocal() as db:
+            purged = crud.purge_refresh_tokens(db)
+            db.commit()
+        print(f"purged {purged} refresh tokens")
+    else:
+        with alchemy_engine.begin() as connection:
+            create_bookkeeping_tables(connection)
+            connection.exec_driver_sql("DELETE FROM schema_migration_lock")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
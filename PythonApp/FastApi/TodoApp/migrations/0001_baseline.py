@@ -0,0 +1,33 @@
+# The schema models.Base.metadata.create_all made when migrations were
+# introduced, copied so later model changes don't alter it. IF NOT EXISTS
+# creates only what is missing, so databases made by create_all before
+# migrations existed are adopted as they are.
+SCHEMA = [
+    "CREATE TABLE IF NOT EXISTS users ("
+    "id INTEGER NOT NULL, email VARCHAR, username VARCHAR, first_name VARCHAR, last_name VARCHAR, "
+    "hashed_pw VARCHAR, is_active BOOLEAN, date_deactivated DATETIME, "
+    "PRIMARY KEY (id))",
+    "CREATE UNIQUE INDEX IF NOT EXISTS ix_users_email ON users (email)",
+    "CREATE INDEX IF NOT EXISTS ix_users_id ON users (id)",
+    "CREATE UNIQUE INDEX IF NOT EXISTS ix_users_username ON users (username)",
+
+    "CREATE TABLE IF NOT EXISTS refresh_tokens ("
+    "id INTEGER NOT NULL, token_hash VARCHAR, user_id INTEGER, date_created DATETIME DEFAULT (CURRENT_TIMESTAMP), "
+    "expires_at DATETIME, revoked_at DATETIME, "
+    "PRIMARY KEY (id), FOREIGN KEY(user_id) REFERENCES users (id))",
+    "CREATE INDEX IF NOT EXISTS ix_refresh_tokens_id ON refresh_tokens (id)",
+    "CREATE UNIQUE INDEX IF NOT EXISTS ix_refresh_tokens_token_hash ON refresh_tokens (token_hash)",
+    "CREATE INDEX IF NOT EXISTS ix_refresh_tokens_user_id ON refresh_tokens (user_id)",
+
+    # The owner indexes are added by 0002.
+    "CREATE TABLE IF NOT EXISTS todos ("
+    "id INTEGER NOT NULL, title VARCHAR, description VARCHAR, priority INTEGER, complete BOOLEAN, "
+    "date_created DATETIME DEFAULT (CURRENT_TIMESTAMP), date_completed DATETIME, owner_id INTEGER, "
+    "PRIMARY KEY (id), FOREIGN KEY(owner_id) REFERENCES users (id))",
+    "CREATE INDEX IF NOT EXISTS ix_todos_id ON todos (id)",
+]
+
+
+def upgrade(context) -> None:
+    for sql in SCHEMA:
+        context.execute(sql)
@@ -0,0 +1,6 @@
+# Composite indexes behind crud.owner_todos_query; create_all only ever added
+# them to databases created after they were declared in models.Todos.
+def upgrade(context) -> None:
+    context.create_index("ix_todos_owner_complete_priority", "todos", ["owner_id", "complete", "priority"])
+    context.create_index("ix_todos_owner_date_created", "todos", ["owner_id", "date_created"])
+    context.create_index("ix_todos_owner_date_completed", "todos", ["owner_id", "date_completed"])
@@ -0,0 +1,26 @@
+# External content FTS5 index over todos.title and todos.description, see
+# crud.search_todos_page. The triggers keep it in step with every write,
+# including the bulk Core statements that never go through the ORM.
+def upgrade(context) -> None:
+    context.execute("CREATE VIRTUAL TABLE IF NOT EXISTS todos_search USING fts5("
+                    "title, description, content='todos', content_rowid='id', "
+                    "tokenize='unicode61 remove_diacritics 2', prefix='2 3')")
+    # Title matches rank above description matches.
+    context.execute("INSERT INTO todos_search (todos_search, rank) VALUES ('rank', 'bm25(2.0, 1.0)')")
+
+    context.execute("CREATE TRIGGER IF NOT EXISTS todos_search_insert AFTER INSERT ON todos BEGIN "
+                    "INSERT INTO todos_search (rowid, title, description) "
+                    "VALUES (new.id, new.title, new.description); END")
+    context.execute("CREATE TRIGGER IF NOT EXISTS todos_search_delete AFTER DELETE ON todos BEGIN "
+                    "INSERT INTO todos_search (todos_search, rowid, title, description) "
+                    "VALUES ('delete', old.id, old.title, old.description); END")
+    context.execute("CREATE TRIGGER IF NOT EXISTS todos_search_update AFTER UPDATE OF title, description ON todos "
+                    "BEGIN "
+                    "INSERT INTO todos_search (todos_search, rowid, title, description) "
+                    "VALUES ('delete', old.id, old.title, old.description); "
+                    "INSERT INTO todos_search (rowid, title, description) "
+                    "VALUES (new.id, new.title, new.description); END")
+
+    # Indexes the rows written before the triggers existed; safe to repeat.
+    context.execute_with_progress("INSERT INTO todos_search (todos_search) VALUES ('rebuild')",
+                                  "indexing todos for search")
@@ -0,0 +1,50 @@
+# One row per (owner, priority, complete) bucket, so GET /todos/stats reads
+# buckets instead of scanning todos. Missing owners and priorities are
+# stored as 0 to keep the bucket key unique.
+BUCKET = "coalesce({row}.owner_id, 0), coalesce({row}.priority, 0), coalesce({row}.complete, 0)"
+# Completion latency only counts complete todos with both dates.
+COMPLETED = "coalesce({row}.complete AND {row}.date_completed IS NOT NULL AND {row}.date_created IS NOT NULL, 0)"
+SECONDS = "CASE WHEN {completed} THEN (julianday({row}.date_completed) - julianday({row}.date_created)) * 86400 " \
+          "ELSE 0 END"
+# Recounts every bucket from todos, as crud.TODO_STATS_REBUILD did when this
+# migration was written; copied so later changes there don't alter it.
+REBUILD = [
+    "DELETE FROM todo_stats",
+    "INSERT INTO todo_stats (owner_id, priority, complete, todos, completed_todos, completion_seconds) "
+    "SELECT coalesce(owner_id, 0), coalesce(priority, 0), coalesce(complete, 0), count(*), "
+    "total(completed), total(CASE WHEN completed THEN (julianday(date_completed) - julianday(date_created)) * 86400 END) "
+    "FROM (SELECT *, coalesce(complete AND date_completed IS NOT NULL AND date_created IS NOT NULL, 0) AS completed "
+    "FROM todos) "
+    "GROUP BY 1, 2, 3",
+]
+
+
+def upgrade(context) -> None:
+    context.execute("CREATE TABLE IF NOT EXISTS todo_stats ("
+                    "owner_id INTEGER NOT NULL, priority INTEGER NOT NULL, complete BOOLEAN NOT NULL, "
+                    "todos INTEGER NOT NULL, completed_todos INTEGER NOT NULL, completion_seconds REAL NOT NULL, "
+                    "PRIMARY KEY (owner_id, priority, complete))")
+
+    # Triggers run in the writing transaction, so the buckets commit or roll
+    # back together with the todos, whichever path wrote them.
+    context.execute("CREATE TRIGGER IF NOT EXISTS todo_stats_insert AFTER INSERT ON todos BEGIN "
+                    f"{count_bucket('new', '+')} END")
+    context.execute("CREATE TRIGGER IF NOT EXISTS todo_stats_delete AFTER DELETE ON todos BEGIN "
+                    f"{count_bucket('old', '-')} END")
+    context.execute("CREATE TRIGGER IF NOT EXISTS todo_stats_update "
+                    "AFTER UPDATE OF owner_id, priority, complete, date_created, date_completed ON todos BEGIN "
+                    f"{count_bucket('old', '-')} {count_bucket('new', '+')} END")
+
+    # Replaces whatever the triggers counted before, so a rerun is safe.
+    context.execute_with_progress(REBUILD, "counting todos into todo_stats")
+
+
+def count_bucket(row: str, sign: str) -> str:
+    completed = COMPLETED.format(row=row)
+    return ("INSERT INTO todo_stats (owner_id, priority, complete, todos, completed_todos, completion_seconds) "
+            f"VALUES ({BUCKET.format(row=row)}, {sign}1, {sign}{completed}, "
+            f"{sign}({SECONDS.format(row=row, completed=completed)})) "
+            "ON CONFLICT (owner_id, priority, complete) DO UPDATE SET "
+            "todos = todos + excluded.todos, "
+            "completed_todos = completed_todos + excluded.completed_todos, "
+            "completion_seconds = completion_seconds + excluded.completion_seconds;")
@@ -1,4 +1,4 @@
-from sqlalchemy import Boolean, Column, DateTime, ForeignKey, Integer, String, func
+from sqlalchemy import Boolean, Column, DateTime, ForeignKey, Index, Integer, String, func
 from sqlalchemy.orm import relationship
 from database import Base
 
@@ -17,6 +17,13 @@ class Todos(Base):
 
     owner = relationship("Users", back_populates="todos")
 
+    # Owner scoped listings filter on these, see crud.owner_todos_query.
+    __table_args__ = (
+        Index("ix_todos_owner_complete_priority", "owner_id", "complete", "priority"),
+        Index("ix_todos_owner_date_created", "owner_id", "date_created"),
+        Index("ix_todos_owner_date_completed", "owner_id", "date_completed"),
+    )
+
 
 class Users(Base):
     __tablename__ = "users"
@@ -31,3 +38,15 @@ class Users(Base):
     date_deactivated = Column(DateTime(timezone=True))
 
     todos = relationship("Todos", back_populates="owner")
+
+
+class RefreshTokens(Base):
+    __tablename__ = "refresh_tokens"
+
+    id = Column(Integer, primary_key=True, index=True)
+    # SHA-256 of the token; the token itself is only ever given to the client.
+    token_hash = Column(String, unique=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), index=True)
+    date_created = Column(DateTime(timezone=True), server_default=func.now())
+    expires_at = Column(DateTime(timezone=True))
+    revoked_at = Column(DateTime(timezone=True))
@@ -0,0 +1,49 @@
+import base64
+import binascii
+import json
+from typing import Optional
+
+from exceptions import invalid_cursor_exception
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+STREAM_CHUNK_SIZE = 1000
+
+
+def encode_cursor(last_id: int) -> str:
+    return encode({"id": last_id})
+
+
+def decode_cursor(cursor: Optional[str]) -> Optional[int]:
+    return decode(cursor, "id")
+
+
+# Ranked results have no stable key to resume after, so they page by offset.
+def encode_offset_cursor(offset: int) -> str:
+    return encode({"offset": offset})
+
+
+def decode_offset_cursor(cursor: Optional[str]) -> int:
+    offset = decode(cursor, "offset")
+    if offset is not None and offset < 0:
+        raise invalid_cursor_exception()
+    return offset or 0
+
+
+# Private Methods
+def encode(payload: dict[str, int]) -> str:
+    raw = json.dumps(payload).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode(cursor: Optional[str], key: str) -> Optional[int]:
+    if not cursor:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        value = json.loads(raw)[key]
+    except (binascii.Error, ValueError, KeyError, TypeError):
+        raise invalid_cursor_exception()
+    if not isinstance(value, int):
+        raise invalid_cursor_exception()
+    return value
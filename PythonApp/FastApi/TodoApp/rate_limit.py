@@ -0,0 +1,103 @@
+import os
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+
+LOGIN_RATE_LIMIT_ENABLED = os.environ.get("TODO_LOGIN_RATE_LIMIT", "1") == "1"
+# Bucket size and refill rate per key; a burst of 0 disables that key.
+LOGIN_USERNAME_BURST = int(os.environ.get("TODO_LOGIN_USERNAME_BURST", 5))
+LOGIN_USERNAME_PER_MINUTE = float(os.environ.get("TODO_LOGIN_USERNAME_PER_MINUTE", 5))
+LOGIN_IP_BURST = int(os.environ.get("TODO_LOGIN_IP_BURST", 20))
+LOGIN_IP_PER_MINUTE = float(os.environ.get("TODO_LOGIN_IP_PER_MINUTE", 60))
+# Caps the in-memory backend so random usernames can't grow it without bound.
+LOGIN_RATE_LIMIT_MAX_KEYS = int(os.environ.get("TODO_LOGIN_RATE_LIMIT_MAX_KEYS", 100000))
+
+
+class RateLimitBackend(ABC):
+    # Token buckets shared by every worker that talks to the same backend. A
+    # shared implementation (e.g. Redis) has to make `consume` atomic per key.
+    @abstractmethod
+    def consume(self, key: str, burst: int, per_second: float) -> float:
+        # Takes one token from the bucket, returning 0 when it was available
+        # or the seconds until the next one otherwise.
+        ...
+
+    @abstractmethod
+    def reset(self, key: str) -> None:
+        ...
+
+
+class MemoryRateLimitBackend(RateLimitBackend):
+    def __init__(self, max_keys: int):
+        self.max_keys = max_keys
+        # key -> (tokens, last refill time)
+        self._buckets: OrderedDict[str, tuple[float, float]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def consume(self, key: str, burst: int, per_second: float) -> float:
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.pop(key, (float(burst), now))
+            tokens = min(float(burst), tokens + (now - updated) * per_second)
+
+            retry_after = 0.0
+            if tokens >= 1:
+                tokens -= 1
+            else:
+                retry_after = (1 - tokens) / per_second if per_second > 0 else float("inf")
+
+            self._buckets[key] = (tokens, now)
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+            return retry_after
+
+    def reset(self, key: str) -> None:
+        with self._lock:
+            self._buckets.pop(key, None)
+
+
+class LoginRateLimiter:
+    def __init__(self, backend: RateLimitBackend, enabled: bool = True):
+        self.backend = backend
+        self.enabled = enabled
+        # key type -> (burst, tokens per second)
+        self.limits = {
+            "username": (LOGIN_USERNAME_BURST, LOGIN_USERNAME_PER_MINUTE / 60),
+            "ip": (LOGIN_IP_BURST, LOGIN_IP_PER_MINUTE / 60),
+        }
+
+        self.allowed = 0
+        self.rejected = {key_type: 0 for key_type in self.limits}
+
+    def check(self, username: str, client_ip: str) -> float:
+        # Returns 0 when the attempt may go ahead, otherwise the seconds to wait.
+        if not self.enabled:
+            return 0.0
+
+        for key_type, value in (("ip", client_ip), ("username", username.lower())):
+            burst, per_second = self.limits[key_type]
+            if burst <= 0:
+                continue
+            retry_after = self.backend.consume(f"login:{key_type}:{value}", burst, per_second)
+            if retry_after:
+                self.rejected[key_type] += 1
+                return retry_after
+        self.allowed += 1
+        return 0.0
+
+    def succeeded(self, username: str) -> None:
+        # Failed attempts before a successful login shouldn't lock the owner out.
+        if self.enabled:
+            self.backend.reset(f"login:username:{username.lower()}")
+
+    def stats(self) -> dict[str, int | bool]:
+        return {
+            "enabled": self.enabled,
+            "allowed": self.allowed,
+            "rejected_by_ip": self.rejected["ip"],
+            "rejected_by_username": self.rejected["username"],
+        }
+
+
+login_rate_limiter = LoginRateLimiter(MemoryRateLimitBackend(LOGIN_RATE_LIMIT_MAX_KEYS), LOGIN_RATE_LIMIT_ENABLED)
@@ -0,0 +1,32 @@
+import json
+from datetime import date, datetime
+from typing import Any
+
+from fastapi.responses import JSONResponse
+
+# orjson is optional; without it the fast path still skips jsonable_encoder
+# but falls back to the standard library encoder.
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+class FastJSONResponse(JSONResponse):
+    # For handlers that already hold plain dicts, lists and datetimes, e.g.
+    # rows from crud's column selects, so FastAPI's encoder walk is skipped.
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+def dumps(content: Any) -> bytes:
+    if orjson:
+        return orjson.dumps(content)
+    return json.dumps(content, default=encode_default, separators=(",", ":")).encode()
+
+
+# Private Methods
+def encode_default(value: Any) -> str:
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
@@ -0,0 +1,85 @@
+import time
+
+# Taken before the heavier imports below; app.py imports this module before
+# any router so `import_seconds` covers loading all of them.
+IMPORT_STARTED = time.perf_counter()
+
+import asyncio
+import importlib
+import logging
+import os
+from contextlib import asynccontextmanager
+from typing import AsyncIterator
+
+from fastapi import APIRouter, FastAPI
+from sqlalchemy.orm import configure_mappers
+
+from database import alchemy_engine, async_engine, async_reader_engine, reader_engine
+from hashing import get_bcrypt_context, hashing_pool
+import migrate
+
+STARTUP_BUDGET_SECONDS = float(os.environ.get("TODO_STARTUP_BUDGET_MS", 2000)) / 1000
+# Off when deploys run `python migrate.py upgrade` themselves.
+MIGRATE_ON_STARTUP = os.environ.get("TODO_MIGRATE_ON_STARTUP", "1") == "1"
+
+logger = logging.getLogger(__name__)
+startup_timings: dict[str, float] = {}
+
+router = APIRouter()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI) -> AsyncIterator[None]:
+    started = time.perf_counter()
+    init_database()
+    ready = time.perf_counter()
+    warm_up_task = asyncio.get_running_loop().run_in_executor(None, warm_up)
+
+    # Imports only happen once, a restarted lifespan (e.g. in tests) adds its own time.
+    import_seconds = startup_timings.get("import_seconds", started - IMPORT_STARTED)
+    startup_timings.update(import_seconds=import_seconds,
+                           lifespan_seconds=ready - started,
+                           total_seconds=import_seconds + ready - started,
+                           budget_seconds=STARTUP_BUDGET_SECONDS)
+    if startup_timings["total_seconds"] > STARTUP_BUDGET_SECONDS:
+        logger.warning("Startup took %.3fs, over the %.3fs budget",
+                       startup_timings["total_seconds"], STARTUP_BUDGET_SECONDS)
+    yield
+
+    try:
+        await warm_up_task
+    except Exception:
+        logger.exception("Warm-up failed")
+    hashing_pool.shutdown()
+    for engine in {alchemy_engine, reader_engine}:
+        engine.dispose()
+    if async_engine:
+        for engine in {async_engine, async_reader_engine}:
+            await engine.dispose()
+
+
+@router.get("/metrics/startup")
+async def read_startup_metrics() -> dict[str, float]:
+    return startup_timings
+
+
+def init_database() -> None:
+    # Once per process however many routers share the engines.
+    if MIGRATE_ON_STARTUP:
+        migrate.upgrade(alchemy_engine)
+    elif migrate.pending_migrations(alchemy_engine):
+        logger.warning("The database schema has pending migrations, run `python migrate.py upgrade`")
+    # Opens the first pooled connections now instead of on the first request.
+    for engine in {alchemy_engine, reader_engine}:
+        with engine.connect():
+            pass
+
+
+def warm_up() -> None:
+    # What used to run on import, done in a thread once the app is already
+    # serving. A request that needs any of it sooner initializes it itself.
+    started = time.perf_counter()
+    configure_mappers()
+    get_bcrypt_context()
+    importlib.import_module("jose.jwt")
+    startup_timings["warm_up_seconds"] = time.perf_counter() - started
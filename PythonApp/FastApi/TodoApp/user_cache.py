@@ -0,0 +1,81 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import NamedTuple, Optional
+
+USER_CACHE_SIZE = int(os.environ.get("TODO_USER_CACHE_SIZE", 10000))
+USER_CACHE_TTL = float(os.environ.get("TODO_USER_CACHE_TTL", 60))
+
+
+class UserCredentials(NamedTuple):
+    id: int
+    username: str
+    hashed_pw: str
+    is_active: Optional[bool]
+    date_deactivated: Optional[datetime]
+
+
+class UserCache:
+    def __init__(self, max_size: int, ttl: float):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries: OrderedDict[str, tuple[UserCredentials, float]] = OrderedDict()
+        self._lock = threading.Lock()
+        # Bumped by every invalidation so a lookup that raced one doesn't
+        # store what it read before the change, see `put`.
+        self._generation = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def generation(self) -> int:
+        return self._generation
+
+    def get(self, username: str) -> Optional[UserCredentials]:
+        with self._lock:
+            entry = self._entries.get(username)
+            if entry and entry[1] > time.monotonic():
+                self._entries.move_to_end(username)
+                self.hits += 1
+                return entry[0]
+            if entry:
+                del self._entries[username]
+            self.misses += 1
+            return None
+
+    def put(self, user: UserCredentials, generation: int) -> None:
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            if generation != self._generation:
+                return
+            self._entries.pop(user.username, None)
+            self._entries[user.username] = (user, time.monotonic() + self.ttl)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, username: str) -> None:
+        with self._lock:
+            self._generation += 1
+            self._entries.pop(username, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions
+        }
+
+
+user_cache = UserCache(USER_CACHE_SIZE, USER_CACHE_TTL)
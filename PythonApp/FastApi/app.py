@@ -0,0 +1,26 @@
+import os
+import sys
+
+# TodoApp modules import each other by top level name.
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "TodoApp"))
+
+# Imported ahead of the routers so its clock covers loading all of them.
+from startup import lifespan, router as startup_router
+
+from fastapi import FastAPI
+
+import auth
+import books
+import books2
+import main
+from instrumentation import instrument
+
+# One process, one set of engines and one schema check for every router:
+#     uvicorn app:app
+app = FastAPI(lifespan=lifespan, exception_handlers=books2.EXCEPTION_HANDLERS)
+instrument(app)
+app.include_router(main.router, tags=["todos"])
+app.include_router(auth.router, tags=["auth"])
+app.include_router(books.router, prefix="/books1", tags=["books"])
+app.include_router(books2.router, prefix="/books2", tags=["books2"])
+app.include_router(startup_router)
@@ -0,0 +1,77 @@
+"""Budget the import time of each app module with `python -X importtime`.
+
+Imports every module in a fresh interpreter, reads its cumulative import time
+and fails when one is over budget or eagerly pulls in a dependency that is
+meant to load lazily (python-jose, passlib):
+
+    python benchmarks/import_time.py
+    python benchmarks/import_time.py --budget main=800 --budget app=1000
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+
+FAST_API_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+TODO_APP_DIR = os.path.join(FAST_API_DIR, "TodoApp")
+
+# module -> milliseconds, with headroom for slower machines
+BUDGETS_MS = {
+    "books": 500,
+    "books2": 500,
+    "main": 1000,
+    "auth": 1000,
+    "app": 1200,
+}
+LAZY_MODULES = ("jose", "passlib")
+
+
+def import_times(module: str, work_dir: str) -> dict[str, int]:
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [TODO_APP_DIR, FAST_API_DIR, env.get("PYTHONPATH")]))
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                            cwd=work_dir, env=env, capture_output=True, text=True)
+    if result.returncode:
+        raise RuntimeError(f"importing {module} failed:\n{result.stderr[-2000:]}")
+
+    # "import time: self [us] | cumulative | imported package", the last entry
+    # for a name is its outermost import.
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        times[name.strip()] = int(cumulative)
+    return times
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--budget", action="append", default=[], metavar="MODULE=MS",
+                        help="override the budget of one module")
+    args = parser.parse_args()
+
+    budgets = dict(BUDGETS_MS)
+    for override in args.budget:
+        module, milliseconds = override.split("=")
+        budgets[module] = float(milliseconds)
+
+    failures = 0
+    with tempfile.TemporaryDirectory() as work_dir:
+        for module, budget in budgets.items():
+            times = import_times(module, work_dir)
+            milliseconds = times[module] / 1000
+            eager = sorted(name for name in LAZY_MODULES if name in times)
+            over_budget = milliseconds > budget
+            failures += over_budget or bool(eager)
+            print(f"{module:<8} {milliseconds:8.1f} ms (budget {budget:.0f} ms)"
+                  f"{'  OVER BUDGET' if over_budget else ''}"
+                  f"{'  eagerly imports ' + ', '.join(eager) if eager else ''}")
+
+    print("import times ok" if not failures else f"{failures} modules failed their import budget")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,359 @@
+"""Load and latency benchmarks for the book and todo FastAPI apps.
+
+Seeds each app with realistic data, drives a weighted read/write/login mix and
+writes throughput plus p50/p95/p99 latency per endpoint to a JSON report.
+
+Every scenario targets the combined app in app.py, the books routers under
+their /books1 and /books2 prefixes.
+
+In-process (ASGI transport, fresh temporary databases):
+
+    python benchmarks/load.py --scenarios books books2 todos auth --output results.json
+
+Against a running server (`uvicorn app:app`), spreading the load over several
+processes:
+
+    python benchmarks/load.py --scenarios todos --url http://localhost:8000 --processes 4
+
+Compare a run with a stored baseline, exiting non-zero on regressions:
+
+    python benchmarks/load.py --output results.json --baseline baseline.json --tolerance 0.2
+"""
+import argparse
+import asyncio
+import importlib
+import json
+import multiprocessing
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+import uuid
+from typing import Awaitable, Callable, Optional
+
+import httpx
+
+FAST_API_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+TODO_APP_DIR = os.path.join(FAST_API_DIR, "TodoApp")
+
+USERNAME = "benchmark"
+PASSWORD = "benchmark-password"
+
+Operation = Callable[[httpx.AsyncClient, dict, random.Random], Awaitable[httpx.Response]]
+
+
+# Books (books.py)
+async def seed_books(clients: dict[str, httpx.AsyncClient], rows: int, rng: random.Random) -> dict:
+    for i in range(rows):
+        await clients["app"].post("/", params={"book_title": f"Title {i}", "book_author": f"Author {i % 50}"})
+    book_ids = [int(book_id) for book_id in (await clients["app"].get("/")).json()]
+    return {"book_ids": book_ids}
+
+
+BOOKS_OPERATIONS: list[tuple[str, int, Operation]] = [
+    ("GET /", 1, lambda client, state, rng: client.get("/")),
+    ("GET /books/{book_id}", 6, lambda client, state, rng: client.get(f"/books/{rng.choice(state['book_ids'])}")),
+    ("POST /", 1, lambda client, state, rng: client.post("/", params={"book_title": "New", "book_author": "New"})),
+    ("PUT /books/{book_id}", 1, lambda client, state, rng: client.put(
+        f"/books/{rng.choice(state['book_ids'])}", params={"book_title": "Updated", "book_author": "Updated"})),
+]
+
+
+# Books (books2.py)
+def random_book(rng: random.Random, book_id: Optional[str] = None) -> dict:
+    return {
+        "id": book_id or str(random_uuid(rng)),
+        "title": f"Title {rng.randint(0, 10 ** 6)}",
+        "description": "Seeded by the load benchmark.",
+        "author": f"Author {rng.randint(0, 99)}",
+        "rating": rng.randint(0, 100)
+    }
+
+
+async def seed_books2(clients: dict[str, httpx.AsyncClient], rows: int, rng: random.Random) -> dict:
+    book_ids = []
+    for _ in range(rows):
+        book = random_book(rng)
+        await clients["app"].post("/", json=book)
+        book_ids.append(book["id"])
+    return {"book_ids": book_ids}
+
+
+BOOKS2_OPERATIONS: list[tuple[str, int, Operation]] = [
+    ("GET /", 2, lambda client, state, rng: client.get("/")),
+    ("GET /?books_to_return", 2, lambda client, state, rng: client.get("/", params={"books_to_return": 10})),
+    ("GET /books/{book_id}", 6, lambda client, state, rng: client.get(f"/books/{rng.choice(state['book_ids'])}")),
+    ("GET /books/search", 2, lambda client, state, rng: client.get(
+        "/books/search", params={"author": f"Author {rng.randint(0, 99)}", "min_rating": 80})),
+    ("POST /", 1, lambda client, state, rng: client.post("/", json=random_book(rng))),
+    ("PUT /books/{book_id}", 1, lambda client, state, rng: client.put(
+        f"/books/{(book_id := rng.choice(state['book_ids']))}", json=random_book(rng, book_id))),
+]
+
+
+# TodoApp (main.py, authenticated through auth.py)
+def random_todo(rng: random.Random) -> dict:
+    return {
+        "title": f"Todo {rng.randint(0, 10 ** 6)}",
+        "description": "Seeded by the load benchmark.",
+        "priority": rng.randint(1, 5),
+        "complete": rng.random() < 0.3
+    }
+
+
+async def login(clients: dict[str, httpx.AsyncClient]) -> str:
+    response = await clients["auth"].post("/token", data={"username": USERNAME, "password": PASSWORD})
+    if response.status_code == 401:
+        await clients["auth"].post("/create/user", json={"username": USERNAME, "email": f"{USERNAME}@example.com",
+                                                         "first_name": "Load", "last_name": "Test",
+                                                         "password": PASSWORD})
+        response = await clients["auth"].post("/token", data={"username": USERNAME, "password": PASSWORD})
+    return response.json()["token"]
+
+
+async def seed_todos(clients: dict[str, httpx.AsyncClient], rows: int, rng: random.Random) -> dict:
+    headers = {"Authorization": f"Bearer {await login(clients)}"}
+    for start in range(0, rows, 1000):
+        await clients["app"].post("/todos/bulk", json=[random_todo(rng) for _ in range(min(1000, rows - start))],
+                                  headers=headers)
+    todo_ids = []
+    page = {"next_cursor": None}
+    while True:
+        params = {"limit": 500, **({"cursor": page["next_cursor"]} if page["next_cursor"] else {})}
+        page = (await clients["app"].get("/", params=params)).json()
+        todo_ids.extend(todo["id"] for todo in page["todos"])
+        if not page["next_cursor"]:
+            return {"headers": headers, "todo_ids": todo_ids}
+
+
+TODOS_OPERATIONS: list[tuple[str, int, Operation]] = [
+    ("GET /", 3, lambda client, state, rng: client.get("/", params={"limit": 50})),
+    ("GET /todos/{todo_id}", 6, lambda client, state, rng: client.get(f"/todos/{rng.choice(state['todo_ids'])}")),
+    ("GET /todos/user", 2, lambda client, state, rng: client.get(
+        "/todos/user", params={"complete": False, "priority": rng.randint(1, 5)}, headers=state["headers"])),
+    ("POST /", 1, lambda client, state, rng: client.post("/", json=random_todo(rng), headers=state["headers"])),
+    ("PUT /todos/{todo_id}", 1, lambda client, state, rng: client.put(
+        f"/todos/{rng.choice(state['todo_ids'])}", json=random_todo(rng))),
+]
+
+
+# Auth (auth.py)
+async def seed_auth(clients: dict[str, httpx.AsyncClient], rows: int, rng: random.Random) -> dict:
+    return {"headers": {"Authorization": f"Bearer {await login(clients)}"}}
+
+
+AUTH_OPERATIONS: list[tuple[str, int, Operation]] = [
+    ("POST /token", 3, lambda client, state, rng: client.post(
+        "/token", data={"username": USERNAME, "password": PASSWORD})),
+    ("POST /token (wrong password)", 1, lambda client, state, rng: client.post(
+        "/token", data={"username": USERNAME, "password": "wrong"})),
+]
+
+# name -> (path prefix in app.py, seed, operations)
+SCENARIOS = {
+    "books": ("/books1", seed_books, BOOKS_OPERATIONS),
+    "books2": ("/books2", seed_books2, BOOKS2_OPERATIONS),
+    "todos": ("", seed_todos, TODOS_OPERATIONS),
+    "auth": ("", seed_auth, AUTH_OPERATIONS),
+}
+
+
+async def drive(client: httpx.AsyncClient, operations: list[tuple[str, int, Operation]], state: dict,
+                total_requests: int, concurrency: int, seed: int) -> tuple[dict[str, list[float]], dict[str, dict], float]:
+    latencies: dict[str, list[float]] = {name: [] for name, _, _ in operations}
+    statuses: dict[str, dict] = {name: {} for name, _, _ in operations}
+    rng = random.Random(seed)
+    plan = rng.choices(operations, weights=[weight for _, weight, _ in operations], k=total_requests)
+    plan.reverse()
+
+    async def worker(worker_id: int) -> None:
+        worker_rng = random.Random(seed * 1000 + worker_id)
+        while plan:
+            name, _, operation = plan.pop()
+            started = time.perf_counter()
+            try:
+                status = str((await operation(client, state, worker_rng)).status_code)
+            except httpx.HTTPError:
+                status = "transport_error"
+            latencies[name].append(time.perf_counter() - started)
+            statuses[name][status] = statuses[name].get(status, 0) + 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker(worker_id) for worker_id in range(concurrency)))
+    return latencies, statuses, time.perf_counter() - started
+
+
+async def run_in_process(scenario: str, args: argparse.Namespace) -> tuple[dict, dict, float]:
+    prefix, seed, operations = SCENARIOS[scenario]
+    app = importlib.import_module("app").app
+    transport = httpx.ASGITransport(app=app)
+
+    # ASGITransport doesn't send lifespan events, so run the startup here.
+    async with app.router.lifespan_context(app), \
+            httpx.AsyncClient(transport=transport, base_url=f"http://benchmark{prefix}") as client, \
+            httpx.AsyncClient(transport=transport, base_url="http://benchmark") as auth_client:
+        state = await seed({"app": client, "auth": auth_client}, args.seed_rows, random.Random(args.seed))
+        return await drive(client, operations, state, args.requests, args.concurrency, args.seed)
+
+
+def run_remote_process(job: tuple[str, argparse.Namespace, int]) -> tuple[dict, dict, float]:
+    scenario, args, index = job
+    prefix, seed, operations = SCENARIOS[scenario]
+
+    async def run() -> tuple[dict, dict, float]:
+        async with httpx.AsyncClient(base_url=args.url.rstrip("/") + prefix, timeout=60) as client, \
+                httpx.AsyncClient(base_url=args.auth_url or args.url, timeout=60) as auth_client:
+            # Only the first process seeds; the others pick up its ids through a fresh read.
+            rows = args.seed_rows if index == 0 else 0
+            state = await seed({"app": client, "auth": auth_client}, rows, random.Random(args.seed))
+            if scenario == "books2" and not state["book_ids"]:
+                state["book_ids"] = [book["id"] for book in (await client.get("/")).json()]
+            return await drive(client, operations, state, args.requests // args.processes,
+                               max(1, args.concurrency // args.processes), args.seed + index)
+
+    return asyncio.run(run())
+
+
+def run_remote(scenario: str, args: argparse.Namespace) -> tuple[dict, dict, float]:
+    if args.processes == 1:
+        return run_remote_process((scenario, args, 0))
+
+    # Seed once, then fan out so that every process starts from the same data.
+    seed_args = argparse.Namespace(**{**vars(args), "requests": 0})
+    run_remote_process((scenario, seed_args, 0))
+    args = argparse.Namespace(**{**vars(args), "seed_rows": 0})
+    with multiprocessing.Pool(args.processes) as pool:
+        results = pool.map(run_remote_process, [(scenario, args, index + 1) for index in range(args.processes)])
+
+    latencies: dict[str, list[float]] = {}
+    statuses: dict[str, dict] = {}
+    for process_latencies, process_statuses, _ in results:
+        for name, values in process_latencies.items():
+            latencies.setdefault(name, []).extend(values)
+        for name, counts in process_statuses.items():
+            for status, count in counts.items():
+                statuses.setdefault(name, {})[status] = statuses.get(name, {}).get(status, 0) + count
+    return latencies, statuses, max(elapsed for _, _, elapsed in results)
+
+
+def percentile(sorted_values: list[float], fraction: float) -> float:
+    index = min(len(sorted_values) - 1, max(0, round(fraction * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def summarize(latencies: dict[str, list[float]], statuses: dict[str, dict], elapsed: float) -> dict:
+    endpoints = {}
+    for name, values in latencies.items():
+        if not values:
+            continue
+        values = sorted(values)
+        endpoints[name] = {
+            "count": len(values),
+            "errors": sum(count for status, count in statuses[name].items()
+                          if not status.isdigit() or int(status) >= 500),
+            "statuses": statuses[name],
+            "throughput": len(values) / elapsed,
+            "mean_ms": sum(values) / len(values) * 1000,
+            "p50_ms": percentile(values, 0.50) * 1000,
+            "p95_ms": percentile(values, 0.95) * 1000,
+            "p99_ms": percentile(values, 0.99) * 1000
+        }
+    total = sum(endpoint["count"] for endpoint in endpoints.values())
+    return {"requests": total, "seconds": elapsed, "throughput": total / elapsed, "endpoints": endpoints}
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list[str]:
+    regressions = []
+    for scenario, summary in results["scenarios"].items():
+        base_summary = baseline.get("scenarios", {}).get(scenario)
+        if not base_summary:
+            continue
+        if summary["throughput"] < base_summary["throughput"] * (1 - tolerance):
+            regressions.append(f"{scenario}: throughput {summary['throughput']:.1f} req/s "
+                               f"vs baseline {base_summary['throughput']:.1f} req/s")
+        for name, endpoint in summary["endpoints"].items():
+            base_endpoint = base_summary["endpoints"].get(name)
+            if not base_endpoint:
+                continue
+            for metric in ("p95_ms", "p99_ms"):
+                if endpoint[metric] > base_endpoint[metric] * (1 + tolerance):
+                    regressions.append(f"{scenario} {name}: {metric} {endpoint[metric]:.2f} "
+                                       f"vs baseline {base_endpoint[metric]:.2f}")
+    return regressions
+
+
+def print_summary(results: dict) -> None:
+    print(f"{'scenario':<8} {'endpoint':<30} {'count':>6} {'req/s':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}  "
+          f"statuses")
+    for scenario, summary in results["scenarios"].items():
+        for name, endpoint in summary["endpoints"].items():
+            print(f"{scenario:<8} {name:<30} {endpoint['count']:>6} {endpoint['throughput']:>9.1f} "
+                  f"{endpoint['p50_ms']:>9.2f} {endpoint['p95_ms']:>9.2f} {endpoint['p99_ms']:>9.2f}  "
+                  f"{endpoint['statuses']}")
+
+
+def prepare_in_process_environment() -> None:
+    # Fresh databases for every run so results are reproducible.
+    work_dir = tempfile.mkdtemp(prefix="fastapi-load-")
+    os.environ.setdefault("TODO_DATABASE_URL", f"sqlite:///{os.path.join(work_dir, 'todos.db')}")
+    os.environ.setdefault("BOOKS_STORAGE", "memory")
+    # The auth scenario logs in as one user from one client to measure hashing,
+    # which the login rate limiter would otherwise turn into 429s.
+    os.environ.setdefault("TODO_LOGIN_RATE_LIMIT", "0")
+    os.chdir(work_dir)
+    sys.path[:0] = [TODO_APP_DIR, FAST_API_DIR]
+
+
+def random_uuid(rng: random.Random) -> uuid.UUID:
+    return uuid.UUID(int=rng.getrandbits(128), version=4)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scenarios", nargs="+", choices=list(SCENARIOS), default=["books", "books2", "todos"])
+    parser.add_argument("--requests", type=int, default=2000, help="requests per scenario")
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--seed-rows", type=int, default=5000)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--url", help="benchmark a running server instead of the in-process app")
+    parser.add_argument("--auth-url", help="server hosting the auth routes when it differs from --url")
+    parser.add_argument("--processes", type=int, default=1, help="load generator processes (with --url)")
+    parser.add_argument("--output", help="write the JSON report here")
+    parser.add_argument("--baseline", help="JSON report to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed relative slowdown")
+    args = parser.parse_args()
+
+    if not args.url:
+        prepare_in_process_environment()
+
+    results = {
+        "meta": {"python": platform.python_version(), "platform": platform.platform(),
+                 "url": args.url, "processes": args.processes, "requests": args.requests,
+                 "concurrency": args.concurrency, "seed_rows": args.seed_rows, "seed": args.seed},
+        "scenarios": {}
+    }
+    for scenario in args.scenarios:
+        if args.url:
+            latencies, statuses, elapsed = run_remote(scenario, args)
+        else:
+            latencies, statuses, elapsed = asyncio.run(run_in_process(scenario, args))
+        results["scenarios"][scenario] = summarize(latencies, statuses, elapsed)
+
+    print_summary(results)
+    if args.output:
+        with open(args.output, "w") as output_file:
+            json.dump(results, output_file, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as baseline_file:
+            regressions = compare(results, json.load(baseline_file), args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
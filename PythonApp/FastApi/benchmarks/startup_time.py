@@ -0,0 +1,69 @@
+"""Measure cold start of the combined app and check it against a budget.
+
+Starts a fresh interpreter per run that imports app.py and runs its lifespan
+startup, timing from process spawn until the app is ready. Exits non-zero when
+the median exceeds the budget:
+
+    python benchmarks/startup_time.py --runs 5 --budget-ms 2000
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+FAST_API_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+CHILD = """
+import asyncio, json, sys
+sys.path.insert(0, {fast_api_dir!r})
+import app
+from startup import startup_timings
+
+async def start():
+    async with app.app.router.lifespan_context(app.app):
+        print(json.dumps(startup_timings), flush=True)
+
+asyncio.run(start())
+"""
+
+
+def cold_start(work_dir: str) -> tuple[float, dict]:
+    started = time.perf_counter()
+    child = subprocess.Popen([sys.executable, "-c", CHILD.format(fast_api_dir=FAST_API_DIR)],
+                             cwd=work_dir, stdout=subprocess.PIPE, text=True)
+    line = child.stdout.readline()
+    ready = time.perf_counter() - started
+    child.wait()
+    if child.returncode:
+        raise RuntimeError(f"app failed to start (exit {child.returncode})")
+    return ready, json.loads(line)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--budget-ms", type=float, default=float(os.environ.get("TODO_STARTUP_BUDGET_MS", 2000)))
+    args = parser.parse_args()
+
+    walls = []
+    with tempfile.TemporaryDirectory() as work_dir:
+        for run in range(args.runs):
+            wall, timings = cold_start(work_dir)
+            walls.append(wall)
+            print(f"run {run + 1}: {wall * 1000:7.1f} ms to ready "
+                  f"(imports {timings['import_seconds'] * 1000:.1f} ms, "
+                  f"lifespan {timings['lifespan_seconds'] * 1000:.1f} ms)")
+
+    median = statistics.median(walls) * 1000
+    within_budget = median <= args.budget_ms
+    print(f"median cold start {median:.1f} ms, budget {args.budget_ms:.0f} ms: "
+          f"{'ok' if within_budget else 'over budget'}")
+    return 0 if within_budget else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,102 @@
+"""Compare TodoApp throughput on the sync and async database engines.
+
+Each mode runs in its own process against a fresh SQLite file with the same
+seed data and request mix:
+
+    python benchmarks/todo_async_db.py --requests 2000 --concurrency 50
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+TODO_APP_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "TodoApp")
+
+
+async def run_workload(total_requests: int, concurrency: int, seed_rows: int) -> dict:
+    import httpx
+    import main
+    import models
+    from database import SessionLocal
+    from startup import init_database
+
+    init_database()
+    db = SessionLocal()
+    db.add_all([models.Todos(title=f"Todo {i}", description="Seeded", priority=i % 5 + 1, complete=False)
+                for i in range(seed_rows)])
+    db.commit()
+    db.close()
+
+    payload = {"title": "Benchmark", "description": "Created", "priority": 3, "complete": False}
+    latencies = []
+    queue = asyncio.Queue()
+    for i in range(total_requests):
+        queue.put_nowait(i)
+
+    async def worker(client: httpx.AsyncClient) -> None:
+        rng = random.Random()
+        while not queue.empty():
+            i = queue.get_nowait()
+            started = time.perf_counter()
+            if i % 10 == 0:
+                await client.post("/", json=payload)
+            elif i % 3 == 0:
+                await client.get("/", params={"limit": 50})
+            else:
+                await client.get(f"/todos/{rng.randint(1, seed_rows)}")
+            latencies.append(time.perf_counter() - started)
+
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://benchmark") as client:
+        started = time.perf_counter()
+        await asyncio.gather(*(worker(client) for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "requests": total_requests,
+        "seconds": elapsed,
+        "throughput": total_requests / elapsed,
+        "p50_ms": statistics.median(latencies) * 1000,
+        "p95_ms": latencies[int(len(latencies) * 0.95) - 1] * 1000
+    }
+
+
+def run_mode(mode: str, args: argparse.Namespace) -> dict:
+    env = dict(os.environ, TODO_ASYNC_DB="1" if mode == "async" else "0")
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [TODO_APP_DIR, env.get("PYTHONPATH")]))
+    with tempfile.TemporaryDirectory() as work_dir:
+        output = subprocess.run([sys.executable, os.path.abspath(__file__), "--worker",
+                                 "--requests", str(args.requests),
+                                 "--concurrency", str(args.concurrency),
+                                 "--seed-rows", str(args.seed_rows)],
+                                cwd=work_dir, env=env, check=True, capture_output=True, text=True).stdout
+    return json.loads(output.splitlines()[-1])
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--seed-rows", type=int, default=5000)
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        print(json.dumps(asyncio.run(run_workload(args.requests, args.concurrency, args.seed_rows))))
+        return
+
+    results = {mode: run_mode(mode, args) for mode in ("sync", "async")}
+    print(f"{'mode':<6} {'req/s':>10} {'p50 ms':>10} {'p95 ms':>10}")
+    for mode, result in results.items():
+        print(f"{mode:<6} {result['throughput']:>10.1f} {result['p50_ms']:>10.2f} {result['p95_ms']:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""Check that relationship endpoints stay within a per request SQL budget.
+
+Seeds owners with todos, then calls GET /todos/with-owner and GET /users/me
+with every loading strategy while TODO_MAX_QUERIES_PER_REQUEST is set, so a
+request that falls back to one query per row fails instead of passing slowly:
+
+    python benchmarks/todo_query_counts.py --budget 2
+"""
+import argparse
+import os
+import re
+import sys
+import tempfile
+
+TODO_APP_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "TodoApp")
+
+OWNERS = 20
+TODOS_PER_OWNER = 5
+
+
+def sql_statements(response) -> int:
+    match = re.search(r'sql;dur=[\d.]+;desc="(\d+) calls"', response.headers.get("server-timing", ""))
+    return int(match.group(1)) if match else 0
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--budget", type=int, default=2, help="SQL statements allowed per request")
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp()
+    os.environ["TODO_DATABASE_URL"] = f"sqlite:///{os.path.join(work_dir, 'counts.db')}"
+    os.environ["TODO_MAX_QUERIES_PER_REQUEST"] = str(args.budget)
+    sys.path.insert(0, TODO_APP_DIR)
+
+    from fastapi.testclient import TestClient
+
+    import main as todo_main
+    import models
+    from auth import get_current_user
+    from database import SessionLocal
+    from dto import Loading
+    from instrumentation import QueryBudgetExceeded
+    from startup import init_database
+
+    init_database()
+    db = SessionLocal()
+    db.execute(models.Users.__table__.insert(), [
+        {"id": owner, "username": f"owner{owner}", "email": f"owner{owner}@example.com", "is_active": True}
+        for owner in range(1, OWNERS + 1)
+    ])
+    db.execute(models.Todos.__table__.insert(), [
+        {"title": f"Todo {i}", "priority": i % 5 + 1, "complete": False, "owner_id": i % OWNERS + 1}
+        for i in range(OWNERS * TODOS_PER_OWNER)
+    ])
+    db.commit()
+    db.close()
+
+    todo_main.app.dependency_overrides[get_current_user] = lambda: {"id": 1, "username": "owner1"}
+    client = TestClient(todo_main.app)
+
+    failures = 0
+    for loading in Loading:
+        for path in (f"/todos/with-owner?limit=50&loading={loading.value}", f"/users/me?loading={loading.value}"):
+            try:
+                response = client.get(path)
+                outcome = f"{response.status_code}, {sql_statements(response)} statements"
+            except QueryBudgetExceeded as error:
+                outcome = f"over budget: {error}"
+                # Lazy loading is expected to blow the budget on listings.
+                failures += loading != Loading.lazy
+            print(f"{loading.value:>8} {path.split('?')[0]:<18} {outcome}")
+
+    print("query budget ok" if not failures else f"{failures} eager loaded requests exceeded the budget")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
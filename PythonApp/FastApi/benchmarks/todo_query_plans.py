@@ -0,0 +1,69 @@
+"""Check that owner scoped todo queries are served by the composite indexes.
+
+Builds every filter combination used by GET /todos/user, runs EXPLAIN QUERY
+PLAN on a fresh seeded database and exits non-zero on a full table scan or a
+plan that misses the expected index:
+
+    python benchmarks/todo_query_plans.py
+"""
+import itertools
+import os
+import sys
+import tempfile
+from datetime import datetime
+
+TODO_APP_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "TodoApp")
+
+FILTER_VALUES = {
+    "complete": True,
+    "priority": 3,
+    "created_after": datetime(2024, 1, 1),
+    "created_before": datetime(2025, 1, 1),
+    "completed_after": datetime(2024, 1, 1),
+    "completed_before": datetime(2025, 1, 1)
+}
+
+
+def explain(db, query) -> list[str]:
+    statement = query.statement.compile(db.get_bind(), compile_kwargs={"literal_binds": True})
+    return [row[-1] for row in db.connection().exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}")]
+
+
+def main() -> int:
+    work_dir = tempfile.mkdtemp()
+    os.environ["TODO_DATABASE_URL"] = f"sqlite:///{os.path.join(work_dir, 'plans.db')}"
+    sys.path.insert(0, TODO_APP_DIR)
+
+    import crud
+    import models
+    from database import SessionLocal, alchemy_engine
+    from dto import TodoFilters
+
+    models.Base.metadata.create_all(bind=alchemy_engine)
+    db = SessionLocal()
+    db.execute(models.Todos.__table__.insert(), [
+        {"title": f"Todo {i}", "priority": i % 5 + 1, "complete": i % 2 == 0, "owner_id": i % 100}
+        for i in range(5000)
+    ])
+    db.commit()
+    db.connection().exec_driver_sql("ANALYZE")
+
+    failures = 0
+    for size in range(len(FILTER_VALUES) + 1):
+        for names in itertools.combinations(FILTER_VALUES, size):
+            filters = TodoFilters(**{name: FILTER_VALUES[name] for name in names})
+            query = crud.owner_todos_query(db, 1, filters).order_by(models.Todos.id)
+            plan = explain(db, query)
+            uses_index = any("USING INDEX ix_todos_owner_" in step for step in plan)
+            full_scan = any(step.startswith("SCAN todos") for step in plan)
+            if full_scan or not uses_index:
+                failures += 1
+                print(f"FAIL {', '.join(names) or 'no filters'}: {' | '.join(plan)}")
+
+    db.close()
+    print("query plans ok" if not failures else f"{failures} query plans missed the owner indexes")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
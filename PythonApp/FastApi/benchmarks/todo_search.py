@@ -0,0 +1,91 @@
+"""Time GET /todos/search against a large seeded database.
+
+Seeds todos through the bulk insert path, so the search index is filled by
+its triggers, then times full word, prefix and multi word searches including
+a deep page. Ranking costs a few microseconds per matching row, so latency
+follows how many todos match rather than table size; the seeded vocabulary is
+large enough that a word matches well under 1% of todos, as in real text.
+Exits non-zero when the median of any query is over budget:
+
+    python benchmarks/todo_search.py --rows 300000 --budget-ms 50
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+TODO_APP_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "TodoApp")
+
+# Real words to query, padded with generated ones to a realistic vocabulary.
+WORDS = ["buy", "milk", "call", "mom", "write", "report", "fix", "bike", "book", "flights", "pay", "rent",
+         "clean", "garage", "water", "plants", "review", "budget", "plan", "party", "walk", "dog", "read",
+         "chapter", "renew", "passport", "order", "groceries", "email", "dentist"]
+SYLLABLES = ["ba", "ce", "di", "fo", "gu", "ka", "le", "mi", "no", "pu", "ra", "se", "ti", "vo", "zu"]
+VOCABULARY_SIZE = 2000
+QUERIES = ["milk", "gro", "pay rent", "passp", "dentist email"]
+REPEATS = 20
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=300000)
+    parser.add_argument("--budget-ms", type=float, default=50)
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp()
+    os.environ["TODO_DATABASE_URL"] = f"sqlite:///{os.path.join(work_dir, 'search.db')}"
+    sys.path.insert(0, TODO_APP_DIR)
+
+    from fastapi.testclient import TestClient
+
+    import crud
+    import main as todo_main
+    from database import SessionLocal
+    from startup import init_database
+
+    init_database()
+    rng = random.Random(0)
+    vocabulary = list(WORDS)
+    while len(vocabulary) < VOCABULARY_SIZE:
+        vocabulary.append("".join(rng.choices(SYLLABLES, k=rng.randint(2, 4))))
+    db = SessionLocal()
+    started = time.perf_counter()
+    for start in range(0, args.rows, crud.MAX_BULK_INSERT_BATCH_SIZE):
+        crud.insert_todos(db, [
+            {"title": " ".join(rng.sample(vocabulary, 3)), "description": " ".join(rng.sample(vocabulary, 8)),
+             "priority": i % 5 + 1, "complete": False}
+            for i in range(start, min(start + crud.MAX_BULK_INSERT_BATCH_SIZE, args.rows))
+        ])
+    db.close()
+    print(f"seeded {args.rows} todos in {time.perf_counter() - started:.1f}s")
+
+    db = SessionLocal()
+    client = TestClient(todo_main.app)
+    failures = 0
+    for query in QUERIES:
+        for cursor in (None, "eyJvZmZzZXQiOiAxMDAwfQ"):  # offset 1000
+            timings = []
+            for _ in range(REPEATS):
+                started = time.perf_counter()
+                response = client.get("/todos/search", params={"q": query, "cursor": cursor})
+                timings.append((time.perf_counter() - started) * 1000)
+            median = statistics.median(timings)
+            matches = db.connection().exec_driver_sql(
+                "SELECT count(*) FROM todos_search WHERE todos_search MATCH ?",
+                (crud.search_expression(query),)).scalar()
+            over_budget = median > args.budget_ms
+            failures += over_budget
+            print(f"{query!r:<18} {'page at 1000' if cursor else 'first page':<12} "
+                  f"{len(response.json()['todos']):>3} of {matches:>6} matches {median:7.1f} ms"
+                  f"{'  OVER BUDGET' if over_budget else ''}")
+
+    db.close()
+    print("search latency ok" if not failures else f"{failures} searches over {args.budget_ms:.0f} ms")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,91 @@
+"""Check GET /todos/stats against a full recount on a large seeded database.
+
+Seeds todos through the bulk insert path and completes, moves and deletes
+some of them with the bulk endpoints' queries, so the summary buckets are
+kept by their triggers. Then times the stats endpoint against a rebuild, which
+scans every todo, and exits non-zero if the two disagree:
+
+    python benchmarks/todo_stats.py --rows 300000
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+TODO_APP_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "TodoApp")
+
+OWNERS = 50
+REPEATS = 20
+
+
+def median_ms(call) -> float:
+    timings = []
+    for _ in range(REPEATS):
+        started = time.perf_counter()
+        call()
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings)
+
+
+def rounded(value):
+    # Summing latency in a different order can differ in the last bits.
+    if isinstance(value, dict):
+        return {key: rounded(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [rounded(item) for item in value]
+    return round(value, 3) if isinstance(value, float) else value
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=300000)
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp()
+    os.environ["TODO_DATABASE_URL"] = f"sqlite:///{os.path.join(work_dir, 'stats.db')}"
+    sys.path.insert(0, TODO_APP_DIR)
+
+    from fastapi.testclient import TestClient
+
+    import crud
+    import main as todo_main
+    from database import SessionLocal
+    from startup import init_database
+
+    init_database()
+    rng = random.Random(0)
+    db = SessionLocal()
+    started = time.perf_counter()
+    for start in range(0, args.rows, crud.MAX_BULK_INSERT_BATCH_SIZE):
+        crud.insert_todos(db, [
+            {"title": f"Todo {i}", "priority": rng.randint(1, 5), "complete": False,
+             "owner_id": rng.randint(1, OWNERS)}
+            for i in range(start, min(start + crud.MAX_BULK_INSERT_BATCH_SIZE, args.rows))
+        ])
+    print(f"seeded {args.rows} todos in {time.perf_counter() - started:.1f}s")
+
+    ids = range(1, args.rows + 1)
+    crud.update_todos(db, rng.sample(ids, args.rows // 3), {"complete": True})
+    crud.update_todos(db, rng.sample(ids, args.rows // 10), {"priority": 3, "owner_id": None})
+    crud.delete_todos(db, rng.sample(ids, args.rows // 20))
+
+    client = TestClient(todo_main.app)
+    incremental = client.get("/todos/stats").json()
+    endpoint_ms = median_ms(lambda: client.get("/todos/stats"))
+    rebuild_ms = median_ms(lambda: crud.rebuild_todo_stats(db))
+    rebuilt = client.get("/todos/stats").json()
+    db.close()
+
+    print(f"GET /todos/stats {endpoint_ms:7.1f} ms, full recount {rebuild_ms:7.1f} ms")
+    if rounded(incremental) != rounded(rebuilt):
+        print("incremental stats differ from a full recount")
+        return 1
+    print("incremental stats match a full recount")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,207 @@
+import atexit
+import json
+import os
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from typing import Any, Iterator, Optional
+
+BOOKS_STORAGE = os.environ.get("BOOKS_STORAGE", "memory")
+BOOKS_STORAGE_PATH = os.environ.get("BOOKS_STORAGE_PATH", "./books.db")
+# Memory backend only: restore each namespace from <dir>/<namespace>.json at
+# startup and write it back when the process exits. Unset keeps books in memory.
+BOOKS_SNAPSHOT_DIR = os.environ.get("BOOKS_SNAPSHOT_DIR")
+
+
+class BookStorage(ABC):
+    # Records are JSON-able dicts kept in insertion order. `version` increases on
+    # every mutation and `next_id` never hands out the same id twice, even after
+    # deletes, so callers can detect stale copies and avoid id collisions.
+    @abstractmethod
+    def version(self) -> int:
+        ...
+
+    @abstractmethod
+    def next_id(self) -> int:
+        ...
+
+    @abstractmethod
+    def seed(self, values: list[dict[str, Any]]) -> None:
+        # Stores values under freshly allocated ids, only if nothing was ever written.
+        ...
+
+    @abstractmethod
+    def load(self) -> list[tuple[str, dict[str, Any]]]:
+        ...
+
+    @abstractmethod
+    def get(self, key: str) -> Optional[dict[str, Any]]:
+        ...
+
+    @abstractmethod
+    def put(self, key: str, value: dict[str, Any]) -> int:
+        ...
+
+    @abstractmethod
+    def delete(self, key: str) -> int:
+        ...
+
+
+class MemoryStorage(BookStorage):
+    def __init__(self, records: Optional[dict[str, dict[str, Any]]] = None, version: int = 0, next_id: int = 1):
+        self._records = dict(records or {})
+        self._version = version
+        self._next_id = next_id
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_snapshot(cls, path: str) -> "MemoryStorage":
+        with open(path) as snapshot_file:
+            snapshot = json.load(snapshot_file)
+        return cls(dict(snapshot["records"]), snapshot["version"], snapshot["next_id"])
+
+    def version(self) -> int:
+        return self._version
+
+    def next_id(self) -> int:
+        with self._lock:
+            allocated = self._next_id
+            self._next_id += 1
+            return allocated
+
+    def seed(self, values: list[dict[str, Any]]) -> None:
+        with self._lock:
+            if self._version:
+                return
+            for value in values:
+                self._records[str(self._next_id)] = value
+                self._next_id += 1
+            self._version += 1
+
+    def load(self) -> list[tuple[str, dict[str, Any]]]:
+        with self._lock:
+            return list(self._records.items())
+
+    def get(self, key: str) -> Optional[dict[str, Any]]:
+        return self._records.get(key)
+
+    def put(self, key: str, value: dict[str, Any]) -> int:
+        with self._lock:
+            self._records[key] = value
+            self._version += 1
+            return self._version
+
+    def delete(self, key: str) -> int:
+        with self._lock:
+            del self._records[key]
+            self._version += 1
+            return self._version
+
+    def snapshot(self, path: str) -> None:
+        with self._lock:
+            snapshot = {"version": self._version, "next_id": self._next_id, "records": list(self._records.items())}
+        temporary_path = f"{path}.tmp"
+        with open(temporary_path, "w") as snapshot_file:
+            json.dump(snapshot, snapshot_file)
+            snapshot_file.flush()
+            os.fsync(snapshot_file.fileno())
+        os.replace(temporary_path, path)
+
+
+class SqliteStorage(BookStorage):
+    # Durable and shared between uvicorn workers; every mutation commits together
+    # with its version bump, and WAL keeps readers from blocking on writers.
+    def __init__(self, path: str, namespace: str):
+        self.namespace = namespace
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.execute("CREATE TABLE IF NOT EXISTS book_records ("
+                                 "namespace TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL, "
+                                 "PRIMARY KEY (namespace, key))")
+        self._connection.execute("CREATE TABLE IF NOT EXISTS book_counters ("
+                                 "namespace TEXT NOT NULL, name TEXT NOT NULL, value INTEGER NOT NULL, "
+                                 "PRIMARY KEY (namespace, name))")
+        self._connection.execute("INSERT OR IGNORE INTO book_counters VALUES (?, 'version', 0), (?, 'next_id', 1)",
+                                 (namespace, namespace))
+
+    def version(self) -> int:
+        with self._lock:
+            return self._counter("version")
+
+    def next_id(self) -> int:
+        with self._lock, self._transaction():
+            allocated = self._counter("next_id")
+            self._bump("next_id")
+            return allocated
+
+    def seed(self, values: list[dict[str, Any]]) -> None:
+        with self._lock, self._transaction():
+            if self._counter("version"):
+                return
+            for value in values:
+                self._connection.execute("INSERT INTO book_records VALUES (?, ?, ?)",
+                                         (self.namespace, str(self._counter("next_id")), json.dumps(value)))
+                self._bump("next_id")
+            self._bump("version")
+
+    def load(self) -> list[tuple[str, dict[str, Any]]]:
+        with self._lock:
+            rows = self._connection.execute("SELECT key, value FROM book_records WHERE namespace = ? ORDER BY rowid",
+                                            (self.namespace,))
+            return [(key, json.loads(value)) for key, value in rows]
+
+    def get(self, key: str) -> Optional[dict[str, Any]]:
+        with self._lock:
+            row = self._connection.execute("SELECT value FROM book_records WHERE namespace = ? AND key = ?",
+                                           (self.namespace, key)).fetchone()
+            return json.loads(row[0]) if row else None
+
+    def put(self, key: str, value: dict[str, Any]) -> int:
+        # Upserting keeps the rowid, so a replaced record keeps its position.
+        with self._lock, self._transaction():
+            self._connection.execute("INSERT INTO book_records VALUES (?, ?, ?) "
+                                     "ON CONFLICT (namespace, key) DO UPDATE SET value = excluded.value",
+                                     (self.namespace, key, json.dumps(value)))
+            return self._bump("version")
+
+    def delete(self, key: str) -> int:
+        with self._lock, self._transaction():
+            self._connection.execute("DELETE FROM book_records WHERE namespace = ? AND key = ?", (self.namespace, key))
+            return self._bump("version")
+
+    def _counter(self, name: str) -> int:
+        return self._connection.execute("SELECT value FROM book_counters WHERE namespace = ? AND name = ?",
+                                        (self.namespace, name)).fetchone()[0]
+
+    def _bump(self, name: str) -> int:
+        self._connection.execute("UPDATE book_counters SET value = value + 1 WHERE namespace = ? AND name = ?",
+                                 (self.namespace, name))
+        return self._counter(name)
+
+    @contextmanager
+    def _transaction(self) -> Iterator[None]:
+        # BEGIN IMMEDIATE takes the write lock up front so read-then-write steps
+        # can't interleave with another worker.
+        self._connection.execute("BEGIN IMMEDIATE")
+        try:
+            yield
+        except BaseException:
+            self._connection.execute("ROLLBACK")
+            raise
+        self._connection.execute("COMMIT")
+
+
+def open_storage(namespace: str) -> BookStorage:
+    if BOOKS_STORAGE == "sqlite":
+        return SqliteStorage(BOOKS_STORAGE_PATH, namespace)
+    if BOOKS_STORAGE == "memory":
+        if not BOOKS_SNAPSHOT_DIR:
+            return MemoryStorage()
+        path = os.path.join(BOOKS_SNAPSHOT_DIR, f"{namespace}.json")
+        storage = MemoryStorage.from_snapshot(path) if os.path.exists(path) else MemoryStorage()
+        atexit.register(storage.snapshot, path)
+        return storage
+    raise ValueError(f"Unknown BOOKS_STORAGE {BOOKS_STORAGE!r}")
@@ -1,86 +1,90 @@
 from typing import Optional
-from fastapi import FastAPI, HTTPException
+from fastapi import APIRouter, FastAPI, HTTPException
 from fastapi.responses import JSONResponse
 
-app = FastAPI()
+from book_storage import open_storage
+
+router = APIRouter()
 
-BOOKS = {
-    1: {'title': 'Title One', 'author': 'Author 1'},
-    2: {'title': 'Title Two', 'author': 'Author 2'},
-    3: {'title': 'Title Three', 'author': 'Author 3'},
-    4: {'title': 'Title Four', 'author': 'Author 4'},
-    5: {'title': 'Title Five', 'author': 'Author 5'}
-}
+# Backend picked by BOOKS_STORAGE, see book_storage.open_storage.
+BOOKS = open_storage("books")
+BOOKS.seed([
+    {'title': 'Title One', 'author': 'Author 1'},
+    {'title': 'Title Two', 'author': 'Author 2'},
+    {'title': 'Title Three', 'author': 'Author 3'},
+    {'title': 'Title Four', 'author': 'Author 4'},
+    {'title': 'Title Five', 'author': 'Author 5'}
+])
 
 
 # GET
-@app.get("/")
+@router.get("/")
 async def read_all_books(skip_book_id: Optional[int] = None) -> dict[int, dict[str, str]]:
+    books = {int(book_id): book for book_id, book in BOOKS.load()}
     if skip_book_id:
-        new_books = BOOKS.copy()
-        del new_books[skip_book_id]
-        return new_books
-    return BOOKS
+        books.pop(skip_book_id, None)
+    return books
 
 
 # Basic GET
-@app.get("/books/my_book")
+@router.get("/books/my_book")
 async def read_favorite_book() -> dict[str, str]:
     return {'book_title': 'My favorite book'}
 
 
 # Query Parameter GET
-@app.get("/books/")
+@router.get("/books/")
 async def read_book(book_id: int) -> dict[str, str]:
-    validate_book_id(book_id)
-    return BOOKS.get(book_id)
+    return validate_book_id(book_id)
 
 
 # Path Parameter GET
-@app.get("/books/{book_id}")
+@router.get("/books/{book_id}")
 async def read_book(book_id: int) -> dict[str, str]:
-    validate_book_id(book_id)
-    return BOOKS.get(book_id)
+    return validate_book_id(book_id)
 
 
 # Basic POST
-@app.post("/")
+@router.post("/")
 async def create_book(book_title: str, book_author: str) -> JSONResponse:
-    book_id = len(BOOKS) + 1
+    book_id = BOOKS.next_id()
     book = {'title': book_title, 'author': book_author}
-    BOOKS[book_id] = book
+    BOOKS.put(str(book_id), book)
     return JSONResponse(status_code=202, content=book)
 
 
 # Basic PUT
-@app.put("/books/{book_id}")
+@router.put("/books/{book_id}")
 async def update_book(book_id: int, book_title: str, book_author: str) -> JSONResponse:
     validate_book_id(book_id)
-    book = BOOKS.get(book_id)
-    book['title'] = book_title
-    book['author'] = book_author
-    BOOKS[book_id] = book
+    book = {'title': book_title, 'author': book_author}
+    BOOKS.put(str(book_id), book)
     return JSONResponse(status_code=202, content=book)
 
 
 # Basic DELETE
-@app.delete("/books/{book_id}")
+@router.delete("/books/{book_id}")
 async def delete_book(book_id: int) -> JSONResponse:
-    validate_book_id(book_id)
-    book = BOOKS.get(book_id)
-    del BOOKS[book_id]
+    book = validate_book_id(book_id)
+    BOOKS.delete(str(book_id))
     return JSONResponse(status_code=202, content=book)
 
 
-@app.delete("/books/")
+@router.delete("/books/")
 async def delete_book(book_id: int) -> JSONResponse:
-    validate_book_id(book_id)
-    book = BOOKS.get(book_id)
-    del BOOKS[book_id]
+    book = validate_book_id(book_id)
+    BOOKS.delete(str(book_id))
     return JSONResponse(status_code=202, content=book)
 
 
 # Helper Method
-def validate_book_id(book_id: int) -> None:
-    if book_id > len(BOOKS) or book_id <= 0:
+def validate_book_id(book_id: int) -> dict[str, str]:
+    book = BOOKS.get(str(book_id)) if book_id > 0 else None
+    if not book:
         raise HTTPException(status_code=401, detail="Invalid Book Id")
+    return book
+
+
+# Standalone app, see app.py for the combined one.
+app = FastAPI()
+app.include_router(router)
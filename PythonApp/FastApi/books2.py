@@ -1,8 +1,14 @@
-from fastapi import FastAPI, Header, HTTPException, Request, status
-from starlette.responses import JSONResponse
+from fastapi import APIRouter, FastAPI, Header, HTTPException, Query, Request, status
+from fastapi.encoders import jsonable_encoder
+from starlette.responses import JSONResponse, Response
 from pydantic import BaseModel, Field
+from bisect import bisect_left, bisect_right, insort
+from hashlib import blake2b
 from uuid import UUID, uuid4
-from typing import Optional
+from typing import Iterator, Optional
+import threading
+
+from book_storage import BookStorage, open_storage
 
 
 class Book(BaseModel):
@@ -42,6 +48,12 @@ class BookNoRating(BaseModel):
                         max_length=100)
 
 
+class InvalidRatingRangeException(Exception):
+    def __init__(self, min_rating, max_rating):
+        self.min_rating = min_rating
+        self.max_rating = max_rating
+
+
 class NegativeNumberException(Exception):
     def __init__(self, books_to_return):
         self.books_to_return = books_to_return
@@ -53,14 +65,129 @@ class InvalidUserException(Exception):
         self.password = password
 
 
-app = FastAPI()
-
-
-BOOKS = []
+class BookStore:
+    # In-process copy of the books held in `storage`, keyed by id; dicts keep
+    # insertion order, so iteration matches the order books were added in and
+    # updates keep their position.
+    # Secondary indexes: author -> ids, and (rating, id) pairs kept sorted.
+    # `generation` mirrors the storage version of this copy; when another worker
+    # writes, the versions differ and the copy is reloaded before the next read.
+    def __init__(self, storage: BookStorage):
+        self.storage = storage
+        self.generation = 0
+        self._books: dict[UUID, Book] = {}
+        self._by_author: dict[str, set[UUID]] = {}
+        self._by_rating: list[tuple[int, UUID]] = []
+        self._lock = threading.RLock()
+
+    def __len__(self) -> int:
+        self.refresh()
+        return len(self._books)
+
+    def __iter__(self) -> Iterator[Book]:
+        self.refresh()
+        return iter(list(self._books.values()))
+
+    def get(self, book_id: UUID) -> Optional[Book]:
+        self.refresh()
+        return self._books.get(book_id)
+
+    def add(self, book: Book) -> None:
+        self.replace(book.id, book)
+
+    def replace(self, book_id: UUID, book: Book) -> None:
+        with self._lock:
+            self.refresh()
+            version = self.storage.put(str(book_id), jsonable_encoder(book))
+            if book_id in self._books:
+                self._unindex(self._books[book_id])
+            self._books[book_id] = book
+            self._index(book)
+            self._advance(version)
+
+    def remove(self, book_id: UUID) -> None:
+        with self._lock:
+            self.refresh()
+            version = self.storage.delete(str(book_id))
+            self._unindex(self._books.pop(book_id))
+            self._advance(version)
+
+    def refresh(self) -> None:
+        version = self.storage.version()
+        if version == self.generation:
+            return
+        with self._lock:
+            self._books = {}
+            self._by_author = {}
+            self._by_rating = []
+            for _, value in self.storage.load():
+                book = Book.parse_obj(value)
+                self._books[book.id] = book
+                self._index(book)
+            self.generation = version
+
+    def search(self, author: Optional[str] = None,
+               min_rating: Optional[int] = None,
+               max_rating: Optional[int] = None) -> list[Book]:
+        self.refresh()
+        # Walk whichever index yields fewer candidates, results are ordered by rating.
+        low = bisect_left(self._by_rating, (min_rating, MIN_UUID)) if min_rating is not None else 0
+        high = bisect_right(self._by_rating, (max_rating, MAX_UUID)) if max_rating is not None \
+            else len(self._by_rating)
+
+        if author is None:
+            return [self._books[book_id] for _, book_id in self._by_rating[low:high]]
+
+        author_ids = self._by_author.get(author, set())
+        if len(author_ids) <= high - low:
+            books = [self._books[book_id] for book_id in author_ids]
+            return sorted((book for book in books
+                           if (min_rating is None or book.rating >= min_rating)
+                           and (max_rating is None or book.rating <= max_rating)),
+                          key=lambda book: (book.rating, book.id))
+        return [self._books[book_id] for _, book_id in self._by_rating[low:high] if book_id in author_ids]
+
+    def _advance(self, version: int) -> None:
+        # A gap means another worker wrote in between, so force a reload.
+        self.generation = version if version == self.generation + 1 else -1
+
+    def _index(self, book: Book) -> None:
+        self._by_author.setdefault(book.author, set()).add(book.id)
+        insort(self._by_rating, (book.rating, book.id))
+
+    def _unindex(self, book: Book) -> None:
+        author_ids = self._by_author[book.author]
+        author_ids.discard(book.id)
+        if not author_ids:
+            del self._by_author[book.author]
+        del self._by_rating[bisect_left(self._by_rating, (book.rating, book.id))]
+
+
+class CatalogCache:
+    # Encoded catalog responses for one BookStore generation only: every book
+    # encoded once, and the bodies built from those keyed by books_to_return ->
+    # (encoded body, etag). read_all_books caps books_to_return at the catalog
+    # size, so there are at most len(BOOKS) + 1 bodies, and all of it is dropped
+    # as soon as the generation moves.
+    def __init__(self):
+        self.generation: Optional[int] = None
+        self.books: list[bytes] = []
+        self.responses: dict[Optional[int], tuple[bytes, str]] = {}
+
+
+MIN_UUID = UUID(int=0)
+MAX_UUID = UUID(int=(1 << 128) - 1)
+
+router = APIRouter()
+
+
+# Backend picked by BOOKS_STORAGE, see book_storage.open_storage.
+BOOKS = BookStore(open_storage("books2"))
+
+CATALOG = CatalogCache()
 
 
 # Exception handlers
-@app.exception_handler(NegativeNumberException)
 async def negative_number_exception_handler(request: Request,
                                             exception: NegativeNumberException):
     return JSONResponse(status_code=418,
@@ -68,7 +195,13 @@ async def negative_number_exception_handler(request: Request,
                                             f"books? You need to read more!"})
 
 
-@app.exception_handler(InvalidUserException)
+async def invalid_rating_range_exception_handler(request: Request,
+                                                 exception: InvalidRatingRangeException):
+    return JSONResponse(status_code=422,
+                        content={"message": f"min_rating {exception.min_rating} is greater than "
+                                            f"max_rating {exception.max_rating}"})
+
+
 async def invalid_user_exception_handler(request: Request,
                                          exception: InvalidUserException):
     return JSONResponse(status_code=401,
@@ -76,60 +209,77 @@ async def invalid_user_exception_handler(request: Request,
 
 
 # API Endpoints
-@app.post('/books/login')
+@router.post('/books/login')
 async def book_login(book_id: UUID, username: Optional[str] = Header(None), password: Optional[str] = Header(None)):
     if not username.__eq__("FastAPIUser") or not password.__eq__("test1234!"):
         raise InvalidUserException(username, password)
     return find_specific_book(book_id)
 
 
-@app.get("/header")
+@router.get("/header")
 async def read_header(random_header: Optional[str] = Header(None)):
     return {"Random-Header": random_header}
 
 
-@app.get("/")
-async def read_all_books(books_to_return: Optional[int] = None) -> list[Book]:
+@router.get("/", response_model=list[Book])
+async def read_all_books(books_to_return: Optional[int] = None,
+                         if_none_match: Optional[str] = Header(None)) -> Response:
     if books_to_return and books_to_return < 0:
         raise NegativeNumberException(books_to_return)
 
     if len(BOOKS) < 1:
         create_books_no_api()
 
-    if books_to_return and len(BOOKS) >= books_to_return > 0:
-        return BOOKS[0:books_to_return]
-    return BOOKS
+    if not (books_to_return and len(BOOKS) >= books_to_return > 0):
+        books_to_return = None
+
+    body, etag = encode_catalog(books_to_return)
+    if if_none_match and etag_matches(if_none_match, etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+    return Response(content=body, media_type="application/json", headers={"ETag": etag})
+
+
+@router.get("/books/search")
+async def search_books(author: Optional[str] = None,
+                       min_rating: Optional[int] = Query(None, ge=0, le=100),
+                       max_rating: Optional[int] = Query(None, ge=0, le=100)) -> list[Book]:
+    if min_rating is not None and max_rating is not None and min_rating > max_rating:
+        raise InvalidRatingRangeException(min_rating, max_rating)
+
+    if len(BOOKS) < 1:
+        create_books_no_api()
+
+    return BOOKS.search(author, min_rating, max_rating)
 
 
-@app.get("/books/{book_id}")
+@router.get("/books/{book_id}")
 async def read_book(book_id: UUID) -> Book:
     return find_specific_book(book_id)
 
 
-@app.get("/books/rating/{book_id}", response_model=BookNoRating)
+@router.get("/books/rating/{book_id}", response_model=BookNoRating)
 async def read_book_no_rating(book_id: UUID) -> Book:
     return find_specific_book(book_id)
 
 
-@app.post("/", status_code=status.HTTP_201_CREATED)
+@router.post("/", status_code=status.HTTP_201_CREATED)
 async def create_book(book: Book) -> Book:
-    BOOKS.append(book)
+    BOOKS.add(book)
     return book
 
 
-@app.put("/books/{book_id}")
+@router.put("/books/{book_id}")
 async def update_book(book_id: UUID, book: Book) -> Book:
-    index = BOOKS.index(find_specific_book(book_id))
+    find_specific_book(book_id)
     book.id = book_id
-    BOOKS[index] = book
+    BOOKS.replace(book_id, book)
     return book
 
 
-@app.delete("/books/{book_id}")
+@router.delete("/books/{book_id}")
 async def delete_book(book_id: UUID) -> str:
-    match = find_specific_book(book_id)
-    index = BOOKS.index(match)
-    del BOOKS[index]
+    find_specific_book(book_id)
+    BOOKS.remove(book_id)
     return f"Book {book_id} has been deleted."
 
 
@@ -152,17 +302,41 @@ def create_books_no_api() -> None:
                   title="Title of book_4",
                   author="Author of book_4",
                   rating=49)
-    BOOKS.append(book_1)
-    BOOKS.append(book_2)
-    BOOKS.append(book_3)
-    BOOKS.append(book_4)
+    BOOKS.add(book_1)
+    BOOKS.add(book_2)
+    BOOKS.add(book_3)
+    BOOKS.add(book_4)
+
+
+def encode_catalog(books_to_return: Optional[int]) -> tuple[bytes, str]:
+    BOOKS.refresh()
+    if CATALOG.generation != BOOKS.generation:
+        # JSONResponse renders without whitespace, so joining the encoded books
+        # gives the same bytes as encoding the list in one go.
+        CATALOG.books = [JSONResponse(content=jsonable_encoder(book)).body for book in BOOKS]
+        CATALOG.responses = {}
+        CATALOG.generation = BOOKS.generation
+
+    cached = CATALOG.responses.get(books_to_return)
+    if cached:
+        return cached
+
+    body = b"[" + b",".join(CATALOG.books[:books_to_return]) + b"]"
+    etag = f'"{blake2b(body, digest_size=16).hexdigest()}"'
+    CATALOG.responses[books_to_return] = (body, etag)
+    return body, etag
+
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    candidates = [candidate.strip().removeprefix("W/") for candidate in if_none_match.split(",")]
+    return "*" in candidates or etag in candidates
 
 
 def find_specific_book(book_id: UUID) -> Book:
-    matched_books = [book for book in BOOKS if book.id == book_id]
-    if not matched_books:
+    book = BOOKS.get(book_id)
+    if not book:
         raise item_cannot_be_found_exception()
-    return matched_books.pop(0)
+    return book
 
 
 def item_cannot_be_found_exception() -> HTTPException:
@@ -171,3 +345,14 @@ def item_cannot_be_found_exception() -> HTTPException:
                          headers={
                              "X-Header-Error": "Nothing to be seen at the UUID"
                          })
+
+
+# Standalone app, see app.py for the combined one.
+EXCEPTION_HANDLERS = {
+    NegativeNumberException: negative_number_exception_handler,
+    InvalidRatingRangeException: invalid_rating_range_exception_handler,
+    InvalidUserException: invalid_user_exception_handler
+}
+
+app = FastAPI(exception_handlers=EXCEPTION_HANDLERS)
+app.include_router(router)
@@ -0,0 +1,87 @@
+import os
+import sys
+import tempfile
+
+import pytest
+
+FAST_API_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+TODO_APP_DIR = os.path.join(FAST_API_DIR, "TodoApp")
+TEST_DIR = tempfile.mkdtemp(prefix="todo-tests-")
+
+# The app reads its settings once at import, so they are set before any test
+# module imports it. The production profile is the strict one: a single writer
+# connection, a separate read pool and WAL; lock waits are cut short.
+os.environ.update({
+    "TODO_DATABASE_URL": f"sqlite:///{os.path.join(TEST_DIR, 'todos.db')}",
+    "TODO_DB_PROFILE": "production",
+    "TODO_DB_BUSY_TIMEOUT_MS": "1000",
+    "TODO_BCRYPT_ROUNDS": "4",
+    "TODO_LOGIN_RATE_LIMIT": "0",
+    "TODO_HASH_QUEUE_LIMIT": "64",
+    "TODO_INSTRUMENTATION": "1",
+    "BOOKS_STORAGE": "memory",
+})
+os.environ.pop("BOOKS_SNAPSHOT_DIR", None)
+sys.path[:0] = [TODO_APP_DIR, FAST_API_DIR]
+
+
+@pytest.fixture(scope="session")
+def app():
+    import app as combined_app
+    from startup import init_database
+
+    init_database()
+    return combined_app.app
+
+
+@pytest.fixture
+def client(app):
+    from fastapi.testclient import TestClient
+
+    return TestClient(app)
+
+
+@pytest.fixture
+def db(app):
+    from database import SessionLocal
+
+    session = SessionLocal()
+    yield session
+    session.close()
+
+
+@pytest.fixture(autouse=True)
+def empty_database(request):
+    yield
+    if "app" not in request.fixturenames:
+        return
+    from auth import token_cache, user_cache
+    from database import alchemy_engine
+
+    with alchemy_engine.begin() as connection:
+        for table in ("refresh_tokens", "todos", "users"):
+            connection.exec_driver_sql(f"DELETE FROM {table}")
+    token_cache.clear()
+    user_cache.clear()
+
+
+@pytest.fixture
+def create_user(client):
+    def create(username: str = "user", password: str = "password") -> dict[str, str]:
+        response = client.post("/create/user", json={"username": username, "email": f"{username}@example.com",
+                                                      "first_name": "First", "last_name": "Last",
+                                                      "password": password})
+        assert response.status_code == 200
+        return {"username": username, "password": password}
+
+    return create
+
+
+@pytest.fixture
+def login(client):
+    def log_in(username: str = "user", password: str = "password") -> dict:
+        response = client.post("/token", data={"username": username, "password": password})
+        assert response.status_code == 200
+        return response.json()
+
+    return log_in
@@ -0,0 +1,84 @@
+import json
+import os
+import subprocess
+import sys
+
+TODO_APP_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "TodoApp")
+
+# The engine is picked when database.py is imported, so each profile runs
+# in its own interpreter.
+CRUD_ROUND_TRIP = """
+import json
+from fastapi.testclient import TestClient
+
+import database
+import main
+
+# The lifespan disposes of the engines, pooled aiosqlite connections would
+# otherwise keep the interpreter from exiting.
+with TestClient(main.app) as client:
+    todo = {"title": "async", "description": "notes", "priority": 2, "complete": False}
+    created = [client.post("/", json=todo).status_code for _ in range(3)]
+    todo_id = client.get("/").json()["todos"][0]["id"]
+    updated = client.put(f"/todos/{todo_id}", json=dict(todo, complete=True)).status_code
+    print(json.dumps({
+        "async_engine": database.async_engine is not None,
+        "created": created,
+        "updated": updated,
+        "read": client.get(f"/todos/{todo_id}").json()["complete"],
+        "deleted": client.delete(f"/todos/{todo_id}").status_code,
+        "remaining": len(client.get("/").json()["todos"]),
+    }))
+"""
+
+ENGINE_SPLIT = """
+import asyncio
+import json
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+
+import database
+from startup import init_database
+
+init_database()
+
+
+async def check() -> dict:
+    async with database.AsyncReadSessionLocal() as db:
+        try:
+            await db.execute(text("DELETE FROM todos"))
+            reader_writes = True
+        except OperationalError:
+            reader_writes = False
+    outcome = {
+        "split": database.async_engine is not database.async_reader_engine,
+        "writer_pool_size": database.async_engine.pool.size(),
+        "reader_writes": reader_writes,
+    }
+    for engine in (database.async_engine, database.async_reader_engine):
+        await engine.dispose()
+    return outcome
+
+print(json.dumps(asyncio.run(check())))
+"""
+
+
+def run_app(tmp_path, script: str, **env: str) -> dict:
+    result = subprocess.run([sys.executable, "-c", script], cwd=tmp_path, capture_output=True, text=True, timeout=60,
+                            env=dict(os.environ, PYTHONPATH=TODO_APP_DIR, TODO_ASYNC_DB="1",
+                                     TODO_DATABASE_URL=f"sqlite:///{tmp_path / 'async.db'}", **env))
+    assert result.returncode == 0, result.stderr[-2000:]
+    return json.loads(result.stdout.splitlines()[-1])
+
+
+def test_async_engine_serves_the_todo_endpoints(tmp_path):
+    outcome = run_app(tmp_path, CRUD_ROUND_TRIP, TODO_DB_PROFILE="default")
+
+    assert outcome == {"async_engine": True, "created": [200, 200, 200], "updated": 200, "read": True,
+                       "deleted": 200, "remaining": 2}
+
+
+def test_async_engine_keeps_the_production_split(tmp_path):
+    assert run_app(tmp_path, ENGINE_SPLIT, TODO_DB_PROFILE="production") == \
+        {"split": True, "writer_pool_size": 1, "reader_writes": False}
+    assert run_app(tmp_path, CRUD_ROUND_TRIP, TODO_DB_PROFILE="production")["remaining"] == 2
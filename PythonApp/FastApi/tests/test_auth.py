@@ -0,0 +1,243 @@
+import asyncio
+import time
+
+import httpx
+import pytest
+
+
+def bearer(token: str) -> dict[str, str]:
+    return {"Authorization": f"Bearer {token}"}
+
+
+async def post_concurrently(app, path: str, data: dict, times: int) -> list[httpx.Response]:
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+        return await asyncio.gather(*(client.post(path, data=data) for _ in range(times)))
+
+
+def test_login(client, create_user, login):
+    create_user()
+
+    assert login()["token"]
+    assert client.post("/token", data={"username": "user", "password": "wrong"}).status_code == 401
+
+
+def test_hashing_metrics_keep_fractions(client, create_user, login):
+    create_user()
+    login()
+
+    metrics = client.get("/metrics/hashing").json()
+
+    assert isinstance(metrics["hash_seconds"], float)
+    assert isinstance(metrics["queue_wait_seconds"], float)
+    assert metrics["hash_seconds"] > 0
+
+
+def test_full_hashing_pool_rejects_logins(app, client, create_user, monkeypatch):
+    import auth
+    from hashing import hashing_pool
+
+    create_user()
+    verify_password = auth.verify_password
+
+    def slow_verify_password(password: str, hashed_pw: str):
+        time.sleep(0.2)
+        return verify_password(password, hashed_pw)
+
+    monkeypatch.setattr(auth, "verify_password", slow_verify_password)
+    monkeypatch.setattr(hashing_pool, "workers", 1)
+    monkeypatch.setattr(hashing_pool, "queue_limit", 1)
+    rejected = hashing_pool.rejected
+
+    responses = asyncio.run(post_concurrently(app, "/token", {"username": "user", "password": "password"}, 4))
+
+    assert sorted(response.status_code for response in responses) == [200, 200, 429, 429]
+    assert all(response.headers["retry-after"] for response in responses if response.status_code == 429)
+    assert hashing_pool.rejected == rejected + 2
+
+
+def test_login_and_refresh_rotation(client, create_user, login):
+    create_user()
+    tokens = login()
+
+    rotated = client.post("/token/refresh", json={"refresh_token": tokens["refresh_token"]})
+    reused = client.post("/token/refresh", json={"refresh_token": tokens["refresh_token"]})
+
+    assert rotated.status_code == 200
+    assert reused.status_code == 401
+    assert client.get("/users/me", headers=bearer(rotated.json()["token"])).json()["username"] == "user"
+
+
+def test_revoked_refresh_tokens_are_rejected(client, create_user, login):
+    create_user()
+    refresh_token = login()["refresh_token"]
+
+    assert client.post("/token/revoke", json={"refresh_token": refresh_token}).status_code == 200
+    assert client.post("/token/refresh", json={"refresh_token": refresh_token}).status_code == 401
+    assert client.post("/token/refresh", json={"refresh_token": "not-a-token"}).status_code == 401
+
+
+def test_dead_refresh_tokens_are_purged(client, db, create_user, login):
+    create_user()
+    refresh_token = login()["refresh_token"]
+    for _ in range(5):
+        refresh_token = client.post("/token/refresh", json={"refresh_token": refresh_token}).json()["refresh_token"]
+    client.post("/token/revoke", json={"refresh_token": refresh_token})
+    login()
+
+    rows = db.connection().exec_driver_sql("SELECT count(*), count(revoked_at) FROM refresh_tokens").one()
+
+    assert tuple(rows) == (1, 0)
+
+
+def test_token_claims_are_cached(client, create_user, login):
+    from auth import token_cache
+
+    create_user()
+    headers = bearer(login()["token"])
+    client.get("/todos/user", headers=headers)
+    hits = token_cache.stats()["hits"]
+    client.get("/todos/user", headers=headers)
+
+    assert token_cache.stats()["size"] == 1
+    assert token_cache.stats()["hits"] == hits + 1
+    assert client.get("/todos/user", headers=bearer("not-a-token")).status_code == 401
+
+
+def test_deactivated_user_loses_access(client, db, create_user, login):
+    import models
+
+    create_user()
+    headers = bearer(login()["token"])
+    assert client.get("/todos/user", headers=headers).status_code == 200
+
+    db.query(models.Users).filter(models.Users.username == "user").one().is_active = False
+    db.commit()
+
+    assert client.get("/todos/user", headers=headers).status_code == 401
+
+
+def test_deactivated_user_is_rejected_on_a_token_cache_miss(client, db, create_user, login):
+    import models
+    from auth import token_cache
+
+    create_user()
+    headers = bearer(login()["token"])
+    db.query(models.Users).filter(models.Users.username == "user").one().is_active = False
+    db.commit()
+    token_cache.clear()
+
+    assert client.get("/todos/user", headers=headers).status_code == 401
+
+
+def test_deactivated_user_cannot_log_in(client, db, create_user, login, monkeypatch):
+    from datetime import datetime, timezone
+
+    import auth
+    import models
+
+    create_user()
+    login()
+    db.query(models.Users).filter(models.Users.username == "user").one().date_deactivated = \
+        datetime.now(timezone.utc)
+    db.commit()
+    refresh_tokens = db.connection().exec_driver_sql("SELECT count(*) FROM refresh_tokens").scalar()
+    hashed = []
+    verify_password = auth.verify_password
+
+    def recording_verify_password(password: str, hashed_pw: str):
+        hashed.append(password)
+        return verify_password(password, hashed_pw)
+
+    monkeypatch.setattr(auth, "verify_password", recording_verify_password)
+
+    assert client.post("/token", data={"username": "user", "password": "password"}).status_code == 401
+    assert hashed == []
+    assert db.connection().exec_driver_sql("SELECT count(*) FROM refresh_tokens").scalar() == refresh_tokens
+
+
+def test_login_holds_no_connection_while_hashing(client, create_user, monkeypatch):
+    import auth
+    from database import alchemy_engine, reader_engine
+
+    create_user()
+    checked_out = []
+    verify_password = auth.verify_password
+
+    def recording_verify_password(password: str, hashed_pw: str):
+        checked_out.append((alchemy_engine.pool.checkedout(), reader_engine.pool.checkedout()))
+        return verify_password(password, hashed_pw)
+
+    monkeypatch.setattr(auth, "verify_password", recording_verify_password)
+
+    assert client.post("/token", data={"username": "user", "password": "password"}).status_code == 200
+    assert checked_out == [(0, 0)]
+
+
+def test_concurrent_logins_share_the_writer(app, create_user):
+    create_user()
+
+    responses = asyncio.run(post_concurrently(app, "/token", {"username": "user", "password": "password"}, 12))
+
+    assert [response.status_code for response in responses] == [200] * 12
+
+
+@pytest.fixture
+def rate_limiter(monkeypatch):
+    from rate_limit import MemoryRateLimitBackend, login_rate_limiter
+
+    monkeypatch.setattr(login_rate_limiter, "enabled", True)
+    monkeypatch.setattr(login_rate_limiter, "backend", MemoryRateLimitBackend(100))
+    return login_rate_limiter
+
+
+def test_repeated_failed_logins_are_rate_limited(client, create_user, rate_limiter):
+    create_user()
+    username_burst = rate_limiter.limits["username"][0]
+
+    statuses = [client.post("/token", data={"username": "user", "password": "wrong"}).status_code
+                for _ in range(username_burst + 1)]
+    limited = client.post("/token", data={"username": "USER", "password": "password"})
+
+    assert statuses == [401] * username_burst + [429]
+    assert limited.status_code == 429
+    assert int(limited.headers["retry-after"]) > 0
+    assert client.post("/token", data={"username": "other", "password": "wrong"}).status_code == 401
+    assert client.get("/metrics/login-rate-limit").json()["rejected_by_username"] == 2
+
+
+def test_successful_login_resets_the_username_bucket(client, create_user, login, rate_limiter):
+    create_user()
+    username_burst = rate_limiter.limits["username"][0]
+
+    for _ in range(username_burst - 1):
+        client.post("/token", data={"username": "user", "password": "wrong"})
+    login()
+
+    assert [client.post("/token", data={"username": "user", "password": "wrong"}).status_code
+            for _ in range(username_burst)] == [401] * username_burst
+
+
+def test_rate_limit_metrics_report_a_boolean(client):
+    assert client.get("/metrics/login-rate-limit").json()["enabled"] is False
+
+
+def test_memory_backend_forgets_the_oldest_keys():
+    from rate_limit import MemoryRateLimitBackend
+
+    backend = MemoryRateLimitBackend(2)
+    for key in ("a", "b", "c"):
+        backend.consume(key, 1, 0)
+
+    assert backend.consume("a", 1, 0) == 0
+    assert backend.consume("c", 1, 0) == float("inf")
+
+
+def test_rate_limit_backends_must_implement_consume_and_reset():
+    from rate_limit import RateLimitBackend
+
+    class ConsumeOnly(RateLimitBackend):
+        def consume(self, key: str, burst: int, per_second: float) -> float:
+            return 0.0
+
+    with pytest.raises(TypeError):
+        ConsumeOnly()
@@ -0,0 +1,85 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import book_storage
+from book_storage import BookStorage, MemoryStorage, SqliteStorage, open_storage
+
+BOOKS = [{"title": "Title One", "author": "Author 1"}, {"title": "Title Two", "author": "Author 2"}]
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def storage(request, tmp_path):
+    if request.param == "memory":
+        return MemoryStorage()
+    return SqliteStorage(str(tmp_path / "books.db"), "books")
+
+
+def test_ids_are_never_reused(storage):
+    storage.seed(BOOKS)
+    storage.delete("2")
+
+    assert storage.next_id() == 3
+    assert [key for key, _ in storage.load()] == ["1"]
+
+
+def test_seeding_happens_once(storage):
+    storage.seed(BOOKS)
+    version = storage.put("1", {"title": "Changed", "author": "Author 1"})
+    storage.seed(BOOKS)
+
+    assert storage.version() == version
+    assert storage.get("1")["title"] == "Changed"
+
+
+def test_concurrent_writers_get_distinct_ids(storage):
+    def add_book(_) -> str:
+        key = str(storage.next_id())
+        storage.put(key, BOOKS[0])
+        return key
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        keys = list(executor.map(add_book, range(200)))
+
+    assert len(set(keys)) == 200
+    assert len(storage.load()) == 200
+    assert storage.version() == 200
+
+
+def test_memory_snapshot_round_trip(tmp_path):
+    storage = MemoryStorage()
+    storage.seed(BOOKS)
+    storage.delete("1")
+    storage.snapshot(str(tmp_path / "books.json"))
+
+    restored = MemoryStorage.from_snapshot(str(tmp_path / "books.json"))
+
+    assert restored.load() == storage.load()
+    assert restored.version() == storage.version()
+    assert restored.next_id() == storage.next_id()
+
+
+def test_open_storage_restores_and_saves_snapshots(tmp_path, monkeypatch):
+    at_exit = []
+    monkeypatch.setattr(book_storage, "BOOKS_SNAPSHOT_DIR", str(tmp_path))
+    monkeypatch.setattr(book_storage.atexit, "register", lambda func, *args: at_exit.append((func, args)))
+
+    storage = open_storage("books")
+    storage.seed(BOOKS)
+    storage.delete("2")
+    for func, args in at_exit:
+        func(*args)
+    restored = open_storage("books")
+    restored.seed(BOOKS)
+
+    assert restored.load() == [("1", BOOKS[0])]
+    assert restored.next_id() == 3
+
+
+def test_backends_must_implement_the_interface():
+    class ReadOnlyStorage(BookStorage):
+        def load(self):
+            return []
+
+    with pytest.raises(TypeError):
+        ReadOnlyStorage()
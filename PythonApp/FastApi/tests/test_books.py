@@ -0,0 +1,110 @@
+from uuid import uuid4
+
+import pytest
+
+
+@pytest.fixture
+def books(monkeypatch):
+    # A fresh, empty catalog per test; the module level one lives for the session.
+    import books2
+    from book_storage import MemoryStorage
+
+    monkeypatch.setattr(books2, "BOOKS", books2.BookStore(MemoryStorage()))
+    monkeypatch.setattr(books2, "CATALOG", books2.CatalogCache())
+    return books2.BOOKS
+
+
+def new_book(**fields) -> dict:
+    return dict({"id": str(uuid4()), "title": "Title", "author": "Author", "description": "Notes", "rating": 50},
+                **fields)
+
+
+def test_books_are_kept_by_uuid(client, books):
+    book = new_book()
+
+    assert client.post("/books2/", json=book).status_code == 201
+    assert client.get(f"/books2/books/{book['id']}").json() == book
+    assert "rating" not in client.get(f"/books2/books/rating/{book['id']}").json()
+
+    updated = client.put(f"/books2/books/{book['id']}", json=dict(book, id=str(uuid4()), rating=70)).json()
+    assert updated == dict(book, rating=70)
+    assert len(books) == 1
+
+    assert client.delete(f"/books2/books/{book['id']}").status_code == 200
+    assert client.get(f"/books2/books/{book['id']}").status_code == 404
+    assert client.get("/books2/books/1").status_code == 422
+
+
+def test_catalog_keeps_insertion_order(client, books):
+    created = [new_book(title=f"Title {i}") for i in range(5)]
+    for book in created:
+        client.post("/books2/", json=book)
+    client.put(f"/books2/books/{created[1]['id']}", json=dict(created[1], title="Changed"))
+
+    assert [book["title"] for book in client.get("/books2/").json()] == \
+        ["Title 0", "Changed", "Title 2", "Title 3", "Title 4"]
+    assert client.get("/books2/", params={"books_to_return": 2}).json() == [created[0], dict(created[1], title="Changed")]
+    assert client.get("/books2/", params={"books_to_return": -1}).status_code == 418
+
+
+def test_search_filters_by_author_and_rating(client, books):
+    created = [new_book(author=f"Author {i % 2}", rating=rating) for i, rating in enumerate([90, 10, 50, 70, 30])]
+    for book in created:
+        client.post("/books2/", json=book)
+
+    def search(**params) -> list[int]:
+        response = client.get("/books2/books/search", params=params)
+        assert response.status_code == 200
+        return [book["rating"] for book in response.json()]
+
+    assert search() == [10, 30, 50, 70, 90]
+    assert search(author="Author 0") == [30, 50, 90]
+    assert search(min_rating=30, max_rating=70) == [30, 50, 70]
+    assert search(author="Author 1", min_rating=20) == [70]
+    assert search(author="Nobody") == []
+
+    client.put(f"/books2/books/{created[0]['id']}", json=dict(created[0], author="Author 1", rating=20))
+    client.delete(f"/books2/books/{created[3]['id']}")
+    assert search(author="Author 1") == [10, 20]
+
+
+def test_search_rejects_bad_rating_ranges(client, books):
+    response = client.get("/books2/books/search", params={"min_rating": 80, "max_rating": 20})
+
+    assert response.status_code == 422
+    assert response.json() == {"message": "min_rating 80 is greater than max_rating 20"}
+    assert client.get("/books2/books/search", params={"max_rating": 101}).status_code == 422
+
+
+def test_catalog_answers_304_until_it_changes(client, books):
+    client.post("/books2/", json=new_book())
+    etag = client.get("/books2/").headers["etag"]
+
+    for if_none_match in (etag, f"W/{etag}", f'"other", {etag}', "*"):
+        response = client.get("/books2/", headers={"If-None-Match": if_none_match})
+        assert response.status_code == 304
+        assert response.headers["etag"] == etag
+    assert client.get("/books2/", headers={"If-None-Match": '"other"'}).status_code == 200
+
+    client.post("/books2/", json=new_book())
+    response = client.get("/books2/", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert len(response.json()) == 2
+    assert response.headers["etag"] != etag
+
+
+def test_catalog_cache_keeps_only_the_current_generation(client, books):
+    import books2
+
+    created = [new_book(title=f"Title {i}") for i in range(3)]
+    for book in created:
+        client.post("/books2/", json=book)
+    for books_to_return in (None, 1, 2, 3, 50):
+        params = {"books_to_return": books_to_return} if books_to_return else {}
+        assert client.get("/books2/", params=params).json() == created[:books_to_return]
+    assert set(books2.CATALOG.responses) == {None, 1, 2, 3}
+
+    client.delete(f"/books2/books/{created[0]['id']}")
+    assert client.get("/books2/", params={"books_to_return": 1}).json() == created[1:2]
+    assert set(books2.CATALOG.responses) == {1}
+    assert books2.CATALOG.generation == books.generation
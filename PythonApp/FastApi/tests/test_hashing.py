@@ -0,0 +1,48 @@
+import pytest
+
+
+@pytest.fixture
+def bcrypt_rounds():
+    import hashing
+
+    rounds = hashing.bcrypt_rounds()
+    yield hashing.set_bcrypt_rounds
+    hashing.set_bcrypt_rounds(rounds)
+
+
+def stored_hash(db) -> str:
+    return db.connection().exec_driver_sql("SELECT hashed_pw FROM users").scalar()
+
+
+def test_login_upgrades_weaker_hashes(db, create_user, login, bcrypt_rounds):
+    bcrypt_rounds(4)
+    create_user()
+    bcrypt_rounds(5)
+
+    login()
+
+    assert stored_hash(db).startswith("$2b$05$")
+
+
+def test_login_keeps_stronger_hashes(db, create_user, login, bcrypt_rounds):
+    bcrypt_rounds(5)
+    create_user()
+    bcrypt_rounds(4)
+
+    login()
+
+    assert stored_hash(db).startswith("$2b$05$")
+
+
+@pytest.mark.parametrize("target_seconds, min_rounds, max_rounds, rounds", [
+    (0.25, 4, 16, 12),
+    (0.25, 13, 16, 13),
+    (10.0, 4, 16, 16),
+])
+def test_calibration_extrapolates_from_one_probe(monkeypatch, target_seconds, min_rounds, max_rounds, rounds):
+    import hashing
+
+    # An 8 round probe taking 10ms: every extra round doubles that.
+    monkeypatch.setattr(hashing, "_timed", lambda func, *args: (None, 0.01))
+
+    assert hashing.calibrate_bcrypt_rounds(target_seconds, min_rounds, max_rounds) == rounds
@@ -0,0 +1,45 @@
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+from benchmarks.import_time import BUDGETS_MS, FAST_API_DIR, LAZY_MODULES, import_times
+
+# The lifespan shuts down the hashing pool, so it runs in its own interpreter.
+WARM_UP = """
+import json
+import sys
+from fastapi.testclient import TestClient
+
+import app
+from startup import startup_timings
+
+loaded_on_import = [name for name in %r if name in sys.modules]
+# Shutting down waits for the warm-up.
+with TestClient(app.app):
+    pass
+print(json.dumps({"loaded_on_import": loaded_on_import,
+                  "loaded_after_startup": [name for name in %r if name in sys.modules],
+                  "warmed_up": "warm_up_seconds" in startup_timings}))
+"""
+
+
+@pytest.mark.parametrize("module", BUDGETS_MS)
+def test_module_imports_within_budget(module, tmp_path):
+    times = import_times(module, str(tmp_path))
+
+    assert times[module] / 1000 <= BUDGETS_MS[module]
+    assert not [name for name in LAZY_MODULES if name in times]
+
+
+def test_lazy_modules_are_loaded_by_the_warm_up(tmp_path):
+    result = subprocess.run([sys.executable, "-c", WARM_UP % (LAZY_MODULES, LAZY_MODULES)], cwd=tmp_path,
+                            capture_output=True, text=True, timeout=60,
+                            env=dict(os.environ, PYTHONPATH=FAST_API_DIR,
+                                     TODO_DATABASE_URL=f"sqlite:///{tmp_path / 'todos.db'}"))
+    assert result.returncode == 0, result.stderr[-2000:]
+
+    assert json.loads(result.stdout.splitlines()[-1]) == \
+        {"loaded_on_import": [], "loaded_after_startup": list(LAZY_MODULES), "warmed_up": True}
@@ -0,0 +1,104 @@
+import os
+import socket
+import subprocess
+import sys
+
+import pytest
+from sqlalchemy import create_engine
+
+import migrate
+
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'migrate.db'}")
+    with engine.begin() as connection:
+        migrate.create_bookkeeping_tables(connection)
+    yield engine
+    engine.dispose()
+
+
+def hold_lock(engine, owner: str, age_seconds: int = 0) -> None:
+    with engine.begin() as connection:
+        connection.exec_driver_sql("INSERT INTO schema_migration_lock (id, owner, acquired_at) "
+                                   "VALUES (1, ?, datetime('now', ?))", (owner, f"-{age_seconds} seconds"))
+
+
+def lock_owner(engine):
+    with engine.connect() as connection:
+        return connection.exec_driver_sql("SELECT owner FROM schema_migration_lock").scalar()
+
+
+def dead_pid() -> int:
+    process = subprocess.Popen([sys.executable, "-c", "pass"])
+    process.wait()
+    return process.pid
+
+
+def test_upgrade_applies_every_migration_once(engine):
+    applied = migrate.upgrade(engine, report=lambda message: None)
+
+    assert applied == [migration.version for migration in migrate.discover_migrations()]
+    assert migrate.upgrade(engine, report=lambda message: None) == []
+    assert lock_owner(engine) is None
+
+
+def test_lock_of_a_dead_process_is_taken_over(engine, monkeypatch):
+    monkeypatch.setattr(migrate, "MIGRATION_LOCK_TIMEOUT", 0)
+    hold_lock(engine, f"{socket.gethostname()}:{dead_pid()}:deadbeef")
+
+    with migrate.migration_lock(engine):
+        assert lock_owner(engine).startswith(f"{socket.gethostname()}:{os.getpid()}:")
+
+
+def test_expired_lock_is_taken_over(engine, monkeypatch):
+    monkeypatch.setattr(migrate, "MIGRATION_LOCK_TIMEOUT", 0)
+    hold_lock(engine, "elsewhere:1:deadbeef", age_seconds=int(migrate.MIGRATION_LOCK_EXPIRY) + 60)
+
+    with migrate.migration_lock(engine):
+        assert lock_owner(engine) != "elsewhere:1:deadbeef"
+
+
+def test_live_lock_is_waited_for(engine, monkeypatch):
+    monkeypatch.setattr(migrate, "MIGRATION_LOCK_TIMEOUT", 0)
+    hold_lock(engine, f"{socket.gethostname()}:{os.getpid()}:deadbeef")
+
+    with pytest.raises(TimeoutError):
+        with migrate.migration_lock(engine):
+            pass
+
+
+def test_heartbeat_fails_once_the_lock_is_taken_over(engine):
+    with migrate.migration_lock(engine) as heartbeat:
+        heartbeat()
+        with engine.begin() as connection:
+            connection.exec_driver_sql("DELETE FROM schema_migration_lock")
+
+        with pytest.raises(RuntimeError):
+            heartbeat()
+
+
+def schema(engine, tables: tuple[str, ...]) -> dict[str, tuple]:
+    with engine.connect() as connection:
+        return {table: (connection.exec_driver_sql(f"PRAGMA table_info({table})").all(),
+                        sorted(tuple(index)[1:3] for index in
+                               connection.exec_driver_sql(f"PRAGMA index_list({table})")))
+                for table in tables}
+
+
+def test_upgrade_builds_the_schema_of_the_models(engine, tmp_path):
+    import models
+
+    reference = create_engine(f"sqlite:///{tmp_path / 'models.db'}")
+    models.Base.metadata.create_all(bind=reference)
+    adopted = create_engine(f"sqlite:///{tmp_path / 'adopted.db'}")
+    models.Base.metadata.create_all(bind=adopted)
+    tables = tuple(models.Base.metadata.tables)
+
+    migrate.upgrade(engine, report=lambda message: None)
+    migrate.upgrade(adopted, report=lambda message: None)
+
+    assert schema(engine, tables) == schema(reference, tables)
+    assert schema(adopted, tables) == schema(reference, tables)
+    reference.dispose()
+    adopted.dispose()
@@ -0,0 +1,60 @@
+import re
+
+import pytest
+
+OWNERS = 20
+TODOS_PER_OWNER = 5
+
+
+def sql_statements(response) -> int:
+    match = re.search(r'sql;dur=[\d.]+;desc="(\d+) calls"', response.headers.get("server-timing", ""))
+    return int(match.group(1)) if match else 0
+
+
+@pytest.fixture
+def owners_with_todos(db):
+    import models
+
+    db.execute(models.Users.__table__.insert(), [
+        {"id": owner, "username": f"owner{owner}", "email": f"owner{owner}@example.com", "is_active": True}
+        for owner in range(1, OWNERS + 1)
+    ])
+    db.execute(models.Todos.__table__.insert(), [
+        {"title": f"Todo {i}", "priority": i % 5 + 1, "complete": False, "owner_id": i % OWNERS + 1}
+        for i in range(OWNERS * TODOS_PER_OWNER)
+    ])
+    db.commit()
+
+
+@pytest.fixture
+def query_budget(app, monkeypatch):
+    # Authentication is stubbed out, as its token lookup isn't per row.
+    import instrumentation
+    from auth import get_current_user
+
+    monkeypatch.setitem(app.dependency_overrides, get_current_user, lambda: {"id": 1, "username": "owner1"})
+    monkeypatch.setattr(instrumentation, "MAX_QUERIES_PER_REQUEST", 2)
+    return instrumentation.MAX_QUERIES_PER_REQUEST
+
+
+@pytest.mark.parametrize("loading", ["selectin", "joined"])
+@pytest.mark.parametrize("path", ["/todos/with-owner", "/users/me"])
+def test_eager_loading_stays_within_the_query_budget(client, owners_with_todos, query_budget, loading, path):
+    response = client.get(path, params={"loading": loading})
+
+    assert response.status_code == 200
+    assert 0 < sql_statements(response) <= query_budget
+
+
+def test_eager_loading_returns_every_owner(client, owners_with_todos, query_budget):
+    todos = client.get("/todos/with-owner", params={"limit": OWNERS * TODOS_PER_OWNER}).json()["todos"]
+
+    assert len(todos) == OWNERS * TODOS_PER_OWNER
+    assert {todo["owner"]["username"] for todo in todos} == {f"owner{owner}" for owner in range(1, OWNERS + 1)}
+
+
+def test_lazy_loading_exceeds_the_query_budget(client, owners_with_todos, query_budget):
+    from instrumentation import QueryBudgetExceeded
+
+    with pytest.raises(QueryBudgetExceeded):
+        client.get("/todos/with-owner", params={"loading": "lazy"})
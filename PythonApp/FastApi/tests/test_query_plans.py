@@ -0,0 +1,54 @@
+import itertools
+from datetime import datetime
+
+import pytest
+
+FILTER_VALUES = {
+    "complete": True,
+    "priority": 3,
+    "created_after": datetime(2024, 1, 1),
+    "created_before": datetime(2025, 1, 1),
+    "completed_after": datetime(2024, 1, 1),
+    "completed_before": datetime(2025, 1, 1)
+}
+FILTER_COMBINATIONS = [names for size in range(len(FILTER_VALUES) + 1)
+                       for names in itertools.combinations(FILTER_VALUES, size)]
+
+
+def explain(db, query) -> list[str]:
+    statement = query.statement.compile(db.get_bind(), compile_kwargs={"literal_binds": True})
+    return [row[-1] for row in db.connection().exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}")]
+
+
+@pytest.fixture(scope="module")
+def seeded(tmp_path_factory):
+    # Its own database, seeded once, so the app tests' cleanup doesn't touch it.
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import Session
+
+    import models
+
+    engine = create_engine(f"sqlite:///{tmp_path_factory.mktemp('plans') / 'plans.db'}")
+    models.Base.metadata.create_all(bind=engine)
+    with Session(engine) as db:
+        db.execute(models.Todos.__table__.insert(), [
+            {"title": f"Todo {i}", "priority": i % 5 + 1, "complete": i % 2 == 0, "owner_id": i % 100}
+            for i in range(5000)
+        ])
+        db.commit()
+        db.connection().exec_driver_sql("ANALYZE")
+        yield db
+    engine.dispose()
+
+
+@pytest.mark.parametrize("names", FILTER_COMBINATIONS, ids=lambda names: "-".join(names) or "no-filters")
+def test_owner_queries_use_the_owner_indexes(seeded, names):
+    import crud
+    import models
+    from dto import TodoFilters
+
+    filters = TodoFilters(**{name: FILTER_VALUES[name] for name in names})
+    plan = explain(seeded, crud.owner_todos_query(seeded, 1, filters).order_by(models.Todos.id))
+
+    assert any("USING INDEX ix_todos_owner_" in step for step in plan), plan
+    assert not any(step.startswith("SCAN todos") for step in plan), plan
@@ -0,0 +1,320 @@
+import json
+from datetime import date, datetime
+
+import pytest
+
+
+def add_todos(client, *titles: str, headers=None) -> None:
+    for title in titles:
+        response = client.post("/", json={"title": title, "description": "notes", "priority": 2, "complete": False},
+                               headers=headers)
+        assert response.status_code == 200
+
+
+def todo_ids(client) -> list[int]:
+    return [todo["id"] for todo in client.get("/").json()["todos"]]
+
+
+def seed_todos(db, count: int) -> None:
+    import models
+
+    db.execute(models.Todos.__table__.insert(), [
+        {"title": f"Todo {i}", "description": "notes", "priority": i % 5 + 1, "complete": False}
+        for i in range(count)
+    ])
+    db.commit()
+
+
+def bearer(token: str) -> dict[str, str]:
+    return {"Authorization": f"Bearer {token}"}
+
+
+def test_listing_pages_with_a_cursor(client, db):
+    seed_todos(db, 120)
+
+    pages, cursor = [], None
+    while True:
+        page = client.get("/", params={"limit": 50, "cursor": cursor}).json()
+        pages.append([todo["title"] for todo in page["todos"]])
+        cursor = page["next_cursor"]
+        if not cursor:
+            break
+
+    assert [len(page) for page in pages] == [50, 50, 20]
+    assert sum(pages, []) == [f"Todo {i}" for i in range(120)]
+
+
+@pytest.mark.parametrize("params, status_code", [({"cursor": "not-a-cursor"}, 400), ({"limit": 0}, 422),
+                                                 ({"limit": 501}, 422)])
+def test_listing_rejects_bad_paging(client, params, status_code):
+    assert client.get("/", params=params).status_code == status_code
+
+
+def test_listing_streams_ndjson(client, db):
+    seed_todos(db, 1500)
+    first_page = client.get("/", params={"limit": 10}).json()
+
+    everything = client.get("/", params={"stream": True})
+    rest = client.get("/", params={"stream": True, "cursor": first_page["next_cursor"]})
+
+    assert everything.headers["content-type"] == "application/x-ndjson"
+    assert [json.loads(line)["title"] for line in everything.text.splitlines()] == \
+        [f"Todo {i}" for i in range(1500)]
+    assert json.loads(rest.text.splitlines()[0])["title"] == "Todo 10"
+    assert len(rest.text.splitlines()) == 1490
+
+
+def test_owner_listing_only_returns_own_todos(client, create_user, login):
+    create_user()
+    headers = bearer(login()["token"])
+    add_todos(client, "mine", "also mine", headers=headers)
+    add_todos(client, "anonymous")
+    client.patch("/todos", json={"ids": todo_ids(client)[:1], "complete": True})
+
+    mine = client.get("/todos/user", headers=headers).json()
+    completed = client.get("/todos/user", params={"complete": True}, headers=headers).json()
+
+    assert [todo["title"] for todo in mine["todos"]] == ["mine", "also mine"]
+    assert [todo["title"] for todo in completed["todos"]] == ["mine"]
+    assert client.get("/todos/user").status_code == 401
+
+
+def test_locked_database_returns_503(client):
+    import sqlite3
+
+    from database import alchemy_engine
+
+    locker = sqlite3.connect(alchemy_engine.url.database)
+    locker.execute("BEGIN IMMEDIATE")
+    try:
+        response = client.post("/", json={"title": "t", "description": "d", "priority": 1, "complete": False})
+    finally:
+        locker.rollback()
+        locker.close()
+
+    assert response.status_code == 503
+    assert response.headers["retry-after"] == "1"
+
+
+def test_writer_pool_timeout_returns_503(client):
+    from database import alchemy_engine
+
+    with alchemy_engine.connect():
+        response = client.post("/", json={"title": "t", "description": "d", "priority": 1, "complete": False})
+
+    assert response.status_code == 503
+
+
+def test_other_database_errors_return_412(client, create_user):
+    create_user()
+
+    response = client.post("/create/user", json={"username": "user", "email": "e", "first_name": "f",
+                                                 "last_name": "l", "password": "p"})
+
+    assert response.status_code == 412
+
+
+def test_bulk_update_and_delete(client):
+    add_todos(client, "one", "two", "three")
+    first, second, third = todo_ids(client)
+
+    updated = client.patch("/todos", json={"ids": [first, second, 999], "complete": True, "priority": 5})
+    deleted = client.delete("/todos", params={"ids": [second, third, 999]})
+
+    assert updated.status_code == 200
+    assert deleted.status_code == 200
+    assert client.get(f"/todos/{first}").json()["complete"] is True
+    assert client.get(f"/todos/{first}").json()["priority"] == 5
+    assert todo_ids(client) == [first]
+
+
+def test_bulk_update_rejects_nulls(client):
+    add_todos(client, "one")
+    todo_id, = todo_ids(client)
+
+    response = client.patch("/todos", json={"ids": [todo_id], "priority": None, "complete": None})
+
+    assert response.status_code == 422
+    assert client.get(f"/todos/{todo_id}").json()["priority"] == 2
+
+
+def test_bulk_update_skips_omitted_fields(client):
+    add_todos(client, "one", "two")
+    first, second = todo_ids(client)
+
+    response = client.patch("/todos", json={"ids": [first], "complete": True})
+
+    assert response.status_code == 200
+    assert client.get(f"/todos/{first}").json()["priority"] == 2
+    assert client.get(f"/todos/{second}").json()["complete"] is False
+
+
+def test_bulk_update_needs_a_field(client):
+    add_todos(client, "one")
+
+    assert client.patch("/todos", json={"ids": todo_ids(client)}).status_code == 400
+
+
+def test_bulk_insert_reports_invalid_items(client):
+    items = [{"title": f"Todo {i}", "description": "notes", "priority": i % 5 + 1, "complete": False}
+             for i in range(25)]
+    items[3] = {"title": "bad priority", "priority": 9, "complete": False}
+    items[7] = "not an object"
+
+    response = client.post("/todos/bulk", params={"batch_size": 10}, json=items)
+
+    assert response.status_code == 201
+    assert response.json()["created"] == 23
+    assert [failure["index"] for failure in response.json()["failed"]] == [3, 7]
+    assert len(todo_ids(client)) == 23
+
+
+def test_bulk_insert_reads_ndjson(client):
+    lines = [json.dumps({"title": f"Todo {i}", "priority": 1, "complete": False}) for i in range(5)]
+    lines.insert(2, "{not json")
+
+    response = client.post("/todos/bulk", content="\n".join(lines) + "\n",
+                           headers={"content-type": "application/x-ndjson"})
+
+    assert response.json()["created"] == 5
+    assert [failure["index"] for failure in response.json()["failed"]] == [2]
+
+
+@pytest.mark.parametrize("body", [b'{"title": "not an array"}', b"[{", b"42"])
+def test_bulk_insert_rejects_other_bodies(client, body):
+    response = client.post("/todos/bulk", content=body, headers={"content-type": "application/json"})
+
+    assert response.status_code == 400
+
+
+def test_bulk_insert_isolates_bad_rows_in_one_transaction(db):
+    from sqlalchemy import event
+
+    import crud
+    from database import alchemy_engine
+
+    rows = [{"id": i + 1, "title": f"Todo {i}", "priority": 1, "complete": False} for i in range(1000)]
+    rows[10]["id"] = rows[500]["id"] = 1
+    commits = []
+
+    def count_commit(connection) -> None:
+        commits.append(connection)
+
+    event.listen(alchemy_engine, "commit", count_commit)
+    try:
+        failures = crud.insert_todos(db, rows)
+    finally:
+        event.remove(alchemy_engine, "commit", count_commit)
+
+    assert [position for position, _ in failures] == [10, 500]
+    assert all("UNIQUE" not in message for _, message in failures)
+    assert len(commits) == 1
+    assert db.query(crud.models.Todos).count() == 998
+
+
+def test_column_rows_match_the_orm_encoding(client, db, create_user, login):
+    from fastapi.encoders import jsonable_encoder
+
+    import models
+    from dto import TodoOut
+
+    create_user()
+    headers = bearer(login()["token"])
+    add_todos(client, "First", "Second", "Third", headers=headers)
+    todo_id = todo_ids(client)[0]
+    client.put(f"/todos/{todo_id}", json={"title": "Done", "description": "notes", "priority": 3, "complete": True})
+
+    expected = [jsonable_encoder(TodoOut.from_orm(todo)) for todo in db.query(models.Todos).order_by(models.Todos.id)]
+
+    assert expected[0]["date_completed"]
+    assert client.get(f"/todos/{todo_id}").json() == expected[0]
+    assert client.get("/").json()["todos"] == expected
+    assert client.get("/todos/user", headers=headers).json()["todos"] == expected
+
+
+@pytest.mark.parametrize("content", [
+    {"id": 1, "title": "Todo", "description": None, "complete": True},
+    [{"date_created": datetime(2024, 5, 6, 7, 8, 9, 123456), "date_completed": date(2024, 5, 6)}],
+])
+def test_standard_library_fallback_encodes_like_orjson(monkeypatch, content):
+    import serialization
+
+    encoded = serialization.dumps(content)
+    monkeypatch.setattr(serialization, "orjson", None)
+
+    assert serialization.dumps(content) == encoded
+
+
+def test_search_matches_prefixes_and_pages(client):
+    add_todos(client, "Buy milk", "Milk the cow", "Call mom", "Pay rent", "milk shake")
+
+    first = client.get("/todos/search", params={"q": "mil", "limit": 2}).json()
+    second = client.get("/todos/search", params={"q": "mil", "limit": 2, "cursor": first["next_cursor"]}).json()
+
+    titles = [todo["title"] for todo in first["todos"] + second["todos"]]
+    assert sorted(titles) == ["Buy milk", "Milk the cow", "milk shake"]
+    assert second["next_cursor"] is None
+
+
+def test_search_follows_updates_and_deletes(client):
+    add_todos(client, "Buy milk", "Feed the cat")
+    milk, cat = todo_ids(client)
+
+    client.put(f"/todos/{cat}", json={"title": "Buy cat food", "description": None, "priority": 1, "complete": False})
+    client.delete(f"/todos/{milk}")
+
+    assert [todo["id"] for todo in client.get("/todos/search", params={"q": "buy"}).json()["todos"]] == [cat]
+    assert client.get("/todos/search", params={"q": "milk"}).json()["todos"] == []
+
+
+@pytest.mark.parametrize("query", ['"*) OR NEAR(', "-", "AND"])
+def test_search_treats_operators_as_text(client, query):
+    add_todos(client, "Buy milk")
+
+    response = client.get("/todos/search", params={"q": query})
+
+    assert response.status_code == 200
+
+
+def test_search_ranks_closer_matches_first(client):
+    add_todos(client, "Milk", "Buy milk and bread and eggs and butter for the weekend", "Feed the cat")
+
+    titles = [todo["title"] for todo in client.get("/todos/search", params={"q": "milk"}).json()["todos"]]
+
+    assert titles == ["Milk", "Buy milk and bread and eggs and butter for the weekend"]
+
+
+def test_stats_match_a_full_recount(client, db):
+    import crud
+
+    add_todos(client, "one", "two", "three", "four")
+    first, second, third, fourth = todo_ids(client)
+    client.patch("/todos", json={"ids": [first, second], "complete": True, "priority": 5})
+    client.delete(f"/todos/{third}")
+
+    stats = client.get("/todos/stats").json()
+    crud.rebuild_todo_stats(db)
+
+    assert stats["todos"] == 3
+    assert stats["completed_todos"] == 2
+    assert {group["priority"]: group["todos"] for group in stats["by_priority"]} == {2: 1, 5: 2}
+    assert client.get("/todos/stats").json() == stats
+
+
+def test_stats_rebuild_is_not_an_endpoint(client):
+    assert client.post("/todos/stats/rebuild").status_code in (404, 405)
+
+
+def test_stats_skip_rolled_back_rows(client, db):
+    import crud
+
+    rows = [{"id": i + 1, "title": f"Todo {i}", "priority": 1 + i % 2, "complete": i % 3 == 0} for i in range(10)]
+    rows[4]["id"] = 1
+    crud.insert_todos(db, rows)
+
+    stats = client.get("/todos/stats").json()
+    crud.rebuild_todo_stats(db)
+
+    assert stats["todos"] == 9
+    assert client.get("/todos/stats").json() == stats
+